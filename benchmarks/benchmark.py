@@ -0,0 +1,293 @@
+"""
+Benchmark of ImageProcessor methods.
+
+Runs every method against synthetic and bundled images at several resolutions and parameter grids,
+reports latency percentiles, throughput and peak memory as json and compares results with a stored baseline.
+
+Usage (from repository root):
+    python benchmarks/benchmark.py --output results.json
+    python benchmarks/benchmark.py --save-baseline benchmarks/baseline.json
+    python benchmarks/benchmark.py --baseline benchmarks/baseline.json
+    python benchmarks/benchmark.py --quick --baseline benchmarks/baseline.json
+    python benchmarks/benchmark.py --backend process --concurrency 4 --methods bilateral_filter
+
+Exits with status 1 when any case is slower or uses more memory than baseline by more than tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+DATA = os.path.join(ROOT, 'data')
+sys.path.insert(0, SRC)
+
+from cv2 import cv2
+import imageprocessor as improc
+import processes
+
+# method -> list of parameter sets
+CASES = {
+    'to_grayscale': [[]],
+    'median_blur': [[3], [5], [7], [15]],
+    'average_blur': [[5, 5], [31, 31], [99, 99]],
+    'gaussian_blur': [[5, 5], [31, 31], [31, 31, True], [99, 99], [99, 99, True], [301, 301], [301, 301, True]],
+    'bilateral_filter': [[5, 75.0], [9, 75.0], [15, 75.0], [15, 75.0, 'guided'], [31, 75.0], [61, 75.0]],
+    'global_threshold': [[127, 255]],
+    'mean_threshold': [[11, 2.0, 255], [51, 2.0, 255]],
+    'gaussian_threshold': [[11, 2.0, 255], [51, 2.0, 255]],
+    'global_threshold_sweep': [[[63, 127, 191], 255]],
+    'mean_threshold_sweep': [[[[11, 2.0], [11, 5.0], [51, 2.0]], 255]],
+    'gaussian_threshold_sweep': [[[[11, 2.0], [11, 5.0], [51, 2.0]], 255]],
+    'sobel': [[1, 0, 3, 0.0], [1, 1, 5, 0.0]],
+    'laplacian': [[1, 0.0], [5, 0.0]],
+    'gradient': [[3], [3, 1]],
+    'canny_edge_detection': [[50, 150], [50, 150, 5, True]],
+    'canny_sweep': [[[[25, 75], [50, 150], [100, 200]]], [[[25, 75], [50, 150], [100, 200]], 5, True]],
+    'haar_frontal_face_detection': [[5, 1.2]],
+    'naive_rotate': [[45], [90]],
+    'rotate': [[45], [90]],
+}
+
+# method -> index of parameter enabling approximate mode. Approximate cases also report difference from the exact result
+APPROXIMATE = {
+    'gaussian_blur': 2,
+}
+
+RESOLUTIONS = [(640, 480), (1920, 1080), (4000, 3000)]
+
+IMAGES = ['synthetic', 'example1.jpg', 'example2.png']
+
+
+def load_image(name : str, size):
+    """
+    Creates benchmark image
+
+    :type name: string
+    :param name: 'synthetic' or name of file in data directory
+
+    :type size: (int, int)
+    :param size: (width, height) of the image
+
+    :rtype: CV_8U
+    :return: BGR image
+    """
+
+    if name == 'synthetic':
+        rng = np.random.default_rng(0)
+        w, h = size
+        gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 20, (h, w, 3)).astype(np.float32)
+        return np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    return cv2.resize(cv2.imread(os.path.join(DATA, name)), size, interpolation=cv2.INTER_AREA)
+
+
+def measure(function, image, params, repeats : int, warmup : int, concurrency : int = 1):
+    """
+    Measures latency and peak memory of a single case
+
+    :type concurrency: int
+    :param concurrency: number of calls running at the same time, latency is then time of the whole round of calls
+
+    :rtype: dict
+    :return: latency percentiles in milliseconds, throughput in megapixels per second and peak memory in bytes
+        (allocations traced by tracemalloc, which include numpy arrays returned by OpenCV, but not memory of worker processes)
+    """
+
+    def call(img):
+        return function(img, *params)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    for _ in range(warmup):
+        function(image.copy(), *params)
+
+    latencies = []
+    for _ in range(repeats):
+        imgs = [image.copy() for _ in range(concurrency)]
+        start = time.perf_counter()
+        results = list(pool.map(call, imgs)) if pool else [call(imgs[0])]
+        latencies.append(time.perf_counter() - start)
+        for res in results:
+            if res[1]:
+                raise ValueError(res[1])
+    if pool:
+        pool.shutdown()
+
+    tracemalloc.start()
+    function(image.copy(), *params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+        'throughput_mpix_s': float(concurrency * megapixels / (np.median(latencies) / 1000)),
+        'peak_bytes': int(peak),
+    }
+
+
+def approximation_error(function, image, params, flag_index : int):
+    """
+    Compares result of approximate mode with the exact one
+
+    :rtype: dict
+    :return: maximum and mean absolute difference in grey levels
+    """
+
+    exact_params = list(params)
+    exact_params[flag_index] = False
+    difference = np.abs(function(image.copy(), *params)[0].astype(np.int16) - function(image.copy(), *exact_params)[0])
+    return {'max_error': int(difference.max()), 'mean_error': float(difference.mean())}
+
+
+def case_key(result):
+    key = '%s|%s|%s|%dx%d' % (result['method'], json.dumps(result['params']), result['image'], result['width'], result['height'])
+    if result.get('backend', 'thread') != 'thread' or result.get('concurrency', 1) != 1:
+        key += '|%s x%d' % (result.get('backend', 'thread'), result.get('concurrency', 1))
+    return key
+
+
+def run(cases, images, resolutions, repeats : int, warmup : int, backend : str = 'thread', concurrency : int = 1, log = sys.stderr):
+    """
+    Runs benchmark
+
+    :type backend: string
+    :param backend: 'thread' calls methods in benchmark threads, 'process' runs methods supported by processes.py in process pool
+        (other methods stay in threads)
+
+    :rtype: dict
+    :return: json serializable benchmark report
+    """
+
+    processor = improc.ImageProcessor()
+    if backend == 'process':
+        processes.PROCESS_METHODS = set(processes.SHARED_METHODS)
+    results = []
+    for image_name in images:
+        for size in resolutions:
+            image = load_image(image_name, size)
+            for method, param_grid in cases.items():
+                function = getattr(processor, method)
+                if backend == 'process':
+                    function = processes.backend(function)
+                for params in param_grid:
+                    result = {'method': method, 'params': params, 'image': image_name, 'width': size[0], 'height': size[1],
+                        'backend': 'process' if method in processes.PROCESS_METHODS else 'thread', 'concurrency': concurrency}
+                    result.update(measure(function, image, params, repeats, warmup, concurrency))
+                    flag_index = APPROXIMATE.get(method)
+                    if flag_index is not None and len(params) > flag_index and params[flag_index]:
+                        result.update(approximation_error(function, image, params, flag_index))
+                    results.append(result)
+                    log.write('%-60s p50 %9.2f ms  p99 %9.2f ms  %8.1f MPix/s  peak %7.1f MB%s\n' % (
+                        case_key(result), result['p50_ms'], result['p99_ms'], result['throughput_mpix_s'], result['peak_bytes'] / 2**20,
+                        '  error max %d mean %.3f' % (result['max_error'], result['mean_error']) if 'max_error' in result else ''))
+    return {
+        'meta': {
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'threads': cv2.getNumThreads(),
+            'process_workers': processes.PROCESS_WORKERS if backend == 'process' else 0,
+            'repeats': repeats,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance : float, min_delta_ms : float = 0):
+    """
+    Compares report with baseline
+
+    :type tolerance: float
+    :param tolerance: allowed relative increase of p50 latency and peak memory (0.25 means 25%)
+
+    :type min_delta_ms: float
+    :param min_delta_ms: latency increases smaller than this are ignored, timer and scheduler noise of sub-millisecond cases exceeds any tolerance
+
+    :rtype: [string]
+    :return: descriptions of regressions
+    """
+
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        base = previous.get(case_key(result))
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'peak_bytes'):
+            if metric == 'p50_ms' and result[metric] - base[metric] < min_delta_ms:
+                continue
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append('%s: %s %.2f -> %.2f (+%.0f%%)' % (
+                    case_key(result), metric, base[metric], result[metric], (result[metric] / base[metric] - 1) * 100))
+    return regressions
+
+
+def parse_resolution(value : str):
+    w, h = value.lower().split('x')
+    return int(w), int(h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', default='.*', help='regular expression selecting methods')
+    parser.add_argument('--images', nargs='+', default=IMAGES, help='synthetic and/or names of files in data directory')
+    parser.add_argument('--resolutions', nargs='+', type=parse_resolution, default=RESOLUTIONS, help='resolutions as WIDTHxHEIGHT')
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--backend', choices=['thread', 'process'], default='thread',
+        help='run methods in threads or in process pool with shared memory handoff (see src/processes.py)')
+    parser.add_argument('--concurrency', type=int, default=1, help='number of calls of a case running at the same time')
+    parser.add_argument('--quick', action='store_true', help='single resolution, synthetic image and 3 repeats')
+    parser.add_argument('--output', help='file to write json report to (default stdout)')
+    parser.add_argument('--baseline', help='baseline report to compare with')
+    parser.add_argument('--save-baseline', help='file to write report to as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignored absolute increase of p50 latency (default 1 ms)')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.images, args.resolutions, args.repeats = ['synthetic'], [RESOLUTIONS[0]], 3
+    cases = {method: grid for method, grid in CASES.items() if re.search(args.methods, method)}
+
+    report = run(cases, args.images, args.resolutions, args.repeats, args.warmup, args.backend, args.concurrency)
+    text = json.dumps(report, indent=2)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                f.write(text)
+    if not args.output and not args.save_baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not {case_key(result) for result in baseline['results']} & {case_key(result) for result in report['results']}:
+            sys.stderr.write('\nNo case of the report is in baseline %s\n' % args.baseline)
+            sys.exit(1)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            sys.stderr.write('\nREGRESSIONS (tolerance %.0f%%):\n' % (args.tolerance * 100))
+            for regression in regressions:
+                sys.stderr.write('  %s\n' % regression)
+            sys.exit(1)
+        sys.stderr.write('\nNo regressions (tolerance %.0f%%)\n' % (args.tolerance * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import os
+import math
+import threading
+import time
+from cv2 import cv2
+import imageprocessor as improc
+import decoding
+import metrics
+
+LANE_CHEAP = 'cheap'
+LANE_HEAVY = 'heavy'
+
+
+def gaussian_cost(ksize_x : int, ksize_y : int, fast : bool = False, *_):
+    if fast and max(ksize_x, ksize_y) >= improc.FAST_BLUR_MIN_KSIZE:
+        return 8.0
+    k = (ksize_x + ksize_y) / 2
+    return 0.0043 * k * k + 0.35 * k
+
+
+def bilateral_cost(d : int, sigma : float = 0, engine : str = 'auto', *_):
+    if improc.bilateral_engine(d, engine) == 'guided':
+        step = max(1, max(d // 2, 1) // 4)
+        return 15.0 + 60.0 / (step * step)
+    return max(18.0, 1.8 * d * d)
+
+
+def median_cost(ksize : int, *_):
+    if ksize <= 3:
+        return 1.5
+    if ksize <= 5:
+        return 7.5
+    return 140.0
+
+
+def face_cost(min_neighbours : int, scale : float, min_size : int = 0, max_size : int = 0, max_detection_dim : int = improc.DETECTION_MAX_DIM, *_):
+    # detection runs on image downscaled to max_detection_dim, so only its cost per pixel is given here (see pixel_cost)
+    return 12.0 / max(math.log(scale), 0.01)
+
+
+# Cost model calibrated with benchmarks/benchmark.py (1920x1080 synthetic image, single core): ImageProcessor method name ->
+# function returning estimated milliseconds of processing of one megapixel from parameters of the method
+COST_MODELS = {
+    'to_grayscale': lambda *_: 0.6,
+    'median_blur': median_cost,
+    'average_blur': lambda *_: 2.5,
+    'gaussian_blur': gaussian_cost,
+    'bilateral_filter': bilateral_cost,
+    'global_threshold': lambda *_: 2.2,
+    'mean_threshold': lambda *_: 3.0,
+    'gaussian_threshold': lambda blocksize, *_: 3.0 + 0.23 * blocksize,
+    'global_threshold_sweep': lambda thresholds, *_: 2.0 * len(thresholds),
+    'mean_threshold_sweep': lambda params, *_: 2.0 * len(params),
+    'gaussian_threshold_sweep': lambda params, *_: sum(3.0 + 0.23 * blocksize for blocksize, _ in params),
+    'sobel': lambda dx, dy, ksize, *_: 0.5 + 0.15 * ksize * ksize,
+    'laplacian': lambda *_: 2.0,
+    'gradient': lambda ksize, orientation = 0: 7.7 if orientation else 4.3,
+    'canny_edge_detection': lambda *_: 16.0,
+    'canny_sweep': lambda thresholds, *_: 16.0 * len(thresholds),
+    'haar_frontal_face_detection': face_cost,
+    'detect_frontal_faces': face_cost,
+    'naive_rotate': lambda angle: 1.9 if angle % 90 == 0 else 12.6,
+    'rotate': lambda angle: 1.7 if angle % 90 == 0 else 24.0,
+}
+
+# cost of methods missing in COST_MODELS in milliseconds per megapixel
+DEFAULT_COST = 20.0
+
+
+def method_cost(method_name : str, params, megapixels : float):
+    """
+    Estimates cost of a single method call
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method or 'run_pipeline'
+
+    :type params: list
+    :param params: Parameters of method. For run_pipeline a single element list containing steps
+
+    :type megapixels: float
+    :param megapixels: Size of processed image
+
+    :rtype: float
+    :return: Estimated milliseconds of processing on a single core
+    """
+
+    if method_name == 'run_pipeline':
+        return sum(method_cost(function.__name__, step_params, megapixels) for _, function, step_params in params[0])
+    model = COST_MODELS.get(method_name)
+    try:
+        cost = model(*params) if model else DEFAULT_COST
+    except (TypeError, ValueError):
+        cost = DEFAULT_COST
+    if method_name in ('haar_frontal_face_detection', 'detect_frontal_faces'):
+        max_detection_dim = params[4] if len(params) > 4 else improc.DETECTION_MAX_DIM
+        return cost * min(megapixels, max_detection_dim * max_detection_dim / 1e6) + megapixels
+    return cost * megapixels
+
+
+def estimate_cost(file, method_name : str, params, max_dim : int = None):
+    """
+    Estimates cost of processing an uploaded image. Size of image is read from its header, so image is not decoded
+
+    :type file: bytes or mmap.mmap
+    :param file: encoded image
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method or 'run_pipeline'
+
+    :type params: list
+    :param params: Parameters of method
+
+    :type max_dim: int
+    :param max_dim: maximum dimension of processed image, see app.process_image_bytes
+
+    :rtype: float
+    :return: Estimated milliseconds of processing on a single core
+    """
+
+    size, _ = decoding.read_header(file)
+    if size:
+        megapixels = size[0] * size[1] / 1e6
+        if max_dim and max(size) > max_dim:
+            megapixels *= (max_dim / max(size)) ** 2
+    else:
+        # unknown formats are assumed to have about one byte per pixel
+        megapixels = len(file) / 1e6
+    return method_cost(method_name, params, megapixels)
+
+
+class AdmissionController:
+    """
+    Bounds estimated cost of requests processed at once by a worker process. Requests over the budget wait for a while
+    and are rejected if budget is not freed in time. Cheap requests have their own lane with separate budget,
+    so they are not queued behind expensive ones. A request more expensive than the whole budget is admitted when its lane is empty.
+    """
+
+    def __init__(self, budget : float, cheap_cost : float, cheap_budget : float, queue_seconds : float):
+        """
+        :type budget: float
+        :param budget: Estimated milliseconds of work admitted at once in heavy lane, 0 disables admission control
+
+        :type cheap_cost: float
+        :param cheap_cost: Requests estimated below this number of milliseconds use cheap lane
+
+        :type cheap_budget: float
+        :param cheap_budget: Estimated milliseconds of work admitted at once in cheap lane
+
+        :type queue_seconds: float
+        :param queue_seconds: Maximum time request waits for budget
+        """
+
+        self.budgets = {LANE_CHEAP: cheap_budget, LANE_HEAVY: budget}
+        self.cheap_cost = cheap_cost
+        self.queue_seconds = queue_seconds
+        self.in_flight = {LANE_CHEAP: 0.0, LANE_HEAVY: 0.0}
+        self.admitted = {LANE_CHEAP: 0, LANE_HEAVY: 0}
+        self.rejected = {LANE_CHEAP: 0, LANE_HEAVY: 0}
+        self.condition = threading.Condition()
+
+    @property
+    def enabled(self):
+        return self.budgets[LANE_HEAVY] > 0
+
+    def acquire(self, cost : float, block : bool = False):
+        """
+        Admits request or rejects it when its lane stays over budget for queue_seconds
+
+        :type cost: float
+        :param cost: Estimated milliseconds of processing (see estimate_cost)
+
+        :type block: bool
+        :param block: Wait for budget as long as needed instead of rejecting. Used for work which is already queued elsewhere (asynchronous jobs)
+
+        :rtype: string, int
+        :return: Lane of admitted request (pass it to release) and None. If request is rejected returns None and number of seconds after which it should be retried
+        """
+
+        lane = LANE_CHEAP if cost < self.cheap_cost else LANE_HEAVY
+        if not self.enabled:
+            return lane, None
+        budget = self.budgets[lane]
+        start = time.perf_counter()
+        deadline = start + self.queue_seconds
+        with self.condition:
+            while self.in_flight[lane] > 0 and self.in_flight[lane] + cost > budget:
+                if block:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.rejected[lane] += 1
+                    metrics.ADMISSION_REJECTED.labels(lane).inc()
+                    # work over budget is done by OpenCV threads of the worker in parallel
+                    excess = self.in_flight[lane] + cost - budget
+                    return None, max(1, math.ceil(excess / 1000 / max(cv2.getNumThreads(), 1)))
+                self.condition.wait(remaining)
+            self.in_flight[lane] += cost
+            self.admitted[lane] += 1
+        metrics.ADMISSION_WAIT_SECONDS.labels(lane).observe(time.perf_counter() - start)
+        return lane, None
+
+    def release(self, lane : str, cost : float):
+        """
+        Returns budget of finished request
+
+        :type lane: string
+        :param lane: Lane returned by acquire
+
+        :type cost: float
+        :param cost: Cost passed to acquire
+        """
+
+        if not self.enabled:
+            return
+        with self.condition:
+            self.in_flight[lane] = max(0.0, self.in_flight[lane] - cost)
+            self.condition.notify_all()
+
+    def stats(self):
+        """
+        Returns admission counters
+
+        :rtype: dict
+        :return: budget, estimated milliseconds in flight, admitted and rejected requests of every lane
+        """
+
+        with self.condition:
+            return {lane: {
+                'budget_ms': self.budgets[lane],
+                'in_flight_ms': self.in_flight[lane],
+                'admitted': self.admitted[lane],
+                'rejected': self.rejected[lane],
+            } for lane in self.budgets}
+
+
+admission_controller = AdmissionController(
+    float(os.environ.get('ADMISSION_BUDGET_MS', 4000)),
+    float(os.environ.get('ADMISSION_CHEAP_COST_MS', 50)),
+    float(os.environ.get('ADMISSION_CHEAP_BUDGET_MS', 1000)),
+    float(os.environ.get('ADMISSION_QUEUE_SECONDS', 1)))
@@ -1,519 +1,1004 @@
-from flask import Flask, send_file, make_response, render_template, request, jsonify
+from flask import Flask, Request, send_file, make_response, render_template, request, jsonify, Response, stream_with_context, abort
 from flask_restful import Api, Resource, reqparse
-from PIL import Image
 import werkzeug
 import os, io, sys
 import numpy as np
 from cv2 import cv2
 import base64
+import json
+import uuid
+import tempfile
 
 import imageprocessor as improc
+import pipeline
+import batch
+from cache import result_cache, make_key
+import jobs
+import video
+import tiling
+import decoding
+import limits
+import admission
+import registry
+import encoding
+import metrics
+
+
+# uploads bigger than this are spooled to named temporary files (werkzeug default threshold)
+UPLOAD_SPOOL_BYTES = 500 * 1024
+
+
+class UploadRequest(Request):
+    """
+        Request spooling big uploads to named temporary files instead of anonymous ones,
+        so videos can be opened by path without copying them (see video.upload_path). Files are removed when request is closed
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename = None, content_length = None):
+        if total_content_length is None or total_content_length > UPLOAD_SPOOL_BYTES:
+            return tempfile.NamedTemporaryFile('wb+')
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = limits.MAX_CONTENT_LENGTH
 api = Api(app)
 imageprocessor = improc.ImageProcessor()
 
-def bgr2rgb_2_params(function):
+RESPONSE_JSON = 'application/json'
+RESPONSE_IMAGE = 'image'
+RESPONSE_MULTIPART = 'multipart/mixed'
+
+# mimetypes matched against Accept header, json comes first so it wins for '*/*'. Any image type selects RESPONSE_IMAGE,
+# a specific one also selects output format (see parse_output)
+RESPONSE_MIMETYPES = [RESPONSE_JSON] + [mimetype for _, mimetype, _, _, _ in encoding.FORMATS.values()] + ['image/*', RESPONSE_MULTIPART]
+
+# optional formData fields accepted by every method endpoint, parsed by parse_max_dim, parse_output, parse_auto_orient and async_requested.
+# Used in OpenAPI description
+REQUEST_OPTIONS = [
+    registry.Param('max_dim', int, 0, minimum=0, description="Maximum dimension of processed image, bigger images are downscaled while decoding and size parameters are scaled accordingly."),
+    registry.Param('preview', registry.boolean, False, description="Process image downscaled to %d px." % decoding.PREVIEW_MAX_DIM),
+    registry.Param('format', str, '', choices=tuple(encoding.FORMATS), description="Output format, default depends on method."),
+    registry.Param('quality', int, 0, minimum=encoding.QUALITY_RANGES['quality'][0], maximum=encoding.QUALITY_RANGES['quality'][1], description="Quality of jpeg and webp output."),
+    registry.Param('compression', int, 0, minimum=encoding.QUALITY_RANGES['compression'][0], maximum=encoding.QUALITY_RANGES['compression'][1], description="Compression level of png output."),
+    registry.Param('auto_orient', registry.boolean, True, description="Rotate image according to its EXIF orientation."),
+    registry.Param('async', registry.boolean, False, description="Process image asynchronously, returns job id."),
+]
+
+def extra_to_json(extra):
     """
-        Decorator for function that converts image from bgr to rgb. Version for functions that returns 2 parameters
+        Converts extra data returned by processing method to json serializable value
 
-        :type function: function
-        :param function: function to wrap
+        :type extra: any
+        :param extra: extra data returned by method (for example numpy array of face coordinates)
 
+        :rtype: any
+        :return: json serializable representation of extra data
     """
-    def wrapper(*args):
-        image, error = function(*args)
-        image, _ = imageprocessor.bgr2rgb(image)
-        return image, error, None
-    return wrapper
+    if isinstance(extra, (np.ndarray, np.generic)):
+        return extra.tolist()
+    if isinstance(extra, (list, tuple)):
+        return [extra_to_json(e) for e in extra]
+    if isinstance(extra, dict):
+        return {k : extra_to_json(v) for k, v in extra.items()}
+    return extra
 
 
-def bgr2rgb_3_params(function):
+def negotiate_response_mode():
     """
-        Decorator for function that converts image from bgr to rgb. Version for functions that returns 3 parameters
+        Chooses response mode based on Accept header of current request.
+        Requests without Accept header or accepting anything (like methodPage.js) get json.
 
-        :type function: function
-        :param function: function to wrap
+        Client accepting only image types this service can not encode gets 406 response.
 
+        :rtype: string
+        :return: one of RESPONSE_JSON, RESPONSE_IMAGE, RESPONSE_MULTIPART
+    """
+    best = request.accept_mimetypes.best_match(RESPONSE_MIMETYPES)
+    if best == 'image/*' and not any(mimetype in ('image/*', '*/*') for mimetype, _ in request.accept_mimetypes):
+        # werkzeug matches 'image/*' also against specific types like 'image/gif', these can not be met
+        best = None
+    if best is None:
+        if any(mimetype.startswith('image/') for mimetype, _ in request.accept_mimetypes):
+            abort(make_not_acceptable_response("Accepted image types are not supported, supported types: %s" % ", ".join(RESPONSE_MIMETYPES[1:-1])))
+        best = RESPONSE_JSON
+    if best == RESPONSE_MULTIPART:
+        return RESPONSE_MULTIPART
+    if best.startswith('image/'):
+        return RESPONSE_IMAGE
+    return RESPONSE_JSON
+
+
+def make_multipart_response(parts):
     """
-    def wrapper(*args):
-        image, error, values = function(*args)
-        image, _ = imageprocessor.bgr2rgb(image)
-        return image, error, values
-    return wrapper  
+        Builds multipart/mixed response
 
-def image_process(file, method, params = None):
+        :type parts: [(string, bytes)]
+        :param parts: list of parts (mimetype, body)
 
+        :rtype: flask.wrappers.Response
+        :return: HTTP response with multipart/mixed body
     """
-        Function that processes image with chosen opencv method.
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for mimetype, content in parts:
+        body.write(('--%s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n' % (boundary, mimetype, len(content))).encode())
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(('--%s--\r\n' % boundary).encode())
+    return Response(body.getvalue(), mimetype='multipart/mixed; boundary=%s' % boundary)
 
-        :type file: bytes
-        :param function: bytes stream containing image data
 
-        :type method: funtion
-        :param function: function to process image with
+def make_image_response(encoded, mimetype, extra = None, mode = None):
+    """
+        Wraps encoded image in HTTP response in mode negotiated with client.
+
+        JSON mode returns base64 encoded image in 'status' field (format used by methodPage.js).
+        Image mode returns raw encoded bytes, extra data is sent as json in X-Extra header.
+        Multipart mode returns multipart/mixed body with image part followed by json part with extra data.
+
+        :type encoded: bytes
+        :param encoded: encoded image
+
+        :type mimetype: string
+        :param mimetype: mimetype of encoded image
+
+        :type extra: any
+        :param extra: extra data returned by method or None
+
+        :type mode: string
+        :param mode: response mode, negotiated from request if not provided
 
         :rtype: flask.wrappers.Response
-        :return: HTTP response containing json with process information - whether it succeeded, error message, processed image in string (status), extra data in string.
+        :return: HTTP response containing processed image
     """
-    
+    mode = mode or negotiate_response_mode()
 
-    npimg = np.fromstring(file, np.uint8)
-    img = cv2.imdecode(npimg, flags=1)
+    if isinstance(encoded, list):
+        return make_images_response(encoded, mimetype, extra, mode)
+
+    if mode == RESPONSE_IMAGE:
+        response = Response(encoded, mimetype=mimetype)
+        if extra is not None:
+            response.headers['X-Extra'] = json.dumps(extra_to_json(extra))
+        return response
+
+    if mode == RESPONSE_MULTIPART:
+        extraJson = json.dumps({'success' : True, 'extra' : extra_to_json(extra)}).encode()
+        return make_multipart_response([(mimetype, encoded), ('application/json', extraJson)])
+
+    img_base64 = base64.b64encode(encoded)
+    if(extra is not None):
+        return jsonify({'success' : True, 'status':str(img_base64), 'mimetype' : mimetype, 'extra' : extra_to_json(extra)})
+    return jsonify({'success' : True, 'status':str(img_base64), 'mimetype' : mimetype})
+
+
+def make_images_response(encoded, mimetype, extra = None, mode = None):
+    """
+        Wraps many encoded images (for example results of a sweep) in HTTP response in mode negotiated with client.
+
+        JSON mode returns list of results in the same format as /batch ({'success', 'status', 'mimetype'}) and extra data.
+        Multipart mode returns one part per image followed by json part with extra data.
+        Image mode can not return many images, so it returns error.
+
+        :type encoded: [bytes]
+        :param encoded: encoded images
+
+        :type mimetype: string
+        :param mimetype: mimetype of encoded images
+
+        :type extra: any
+        :param extra: extra data returned by method or None
+
+        :type mode: string
+        :param mode: response mode, negotiated from request if not provided
+
+        :rtype: flask.wrappers.Response
+        :return: HTTP response containing processed images
+    """
+    mode = mode or negotiate_response_mode()
+
+    if mode == RESPONSE_IMAGE:
+        return make_error_response("Many images can be returned only as json or multipart/mixed, add sheet=1 field to get a single image", mode)
+
+    if mode == RESPONSE_MULTIPART:
+        extraJson = json.dumps({'success' : True, 'extra' : extra_to_json(extra)}).encode()
+        return make_multipart_response([(mimetype, data) for data in encoded] + [('application/json', extraJson)])
+
+    results = [{'success' : True, 'status' : str(base64.b64encode(data)), 'mimetype' : mimetype} for data in encoded]
+    return jsonify({'success' : True, 'results' : results, 'extra' : extra_to_json(extra)})
+
+
+def make_error_response(error, mode = None):
+    """
+        Wraps error message in HTTP response. JSON clients get success flag set to False (format used by methodPage.js),
+        clients expecting binary response get the same json with 400 status code.
+
+        :type error: string
+        :param error: error message
+
+        :rtype: flask.wrappers.Response
+        :return: HTTP response containing error
+    """
+    mode = mode or negotiate_response_mode()
+    if mode == RESPONSE_JSON:
+        return jsonify({'success' : False, 'err' : error})
+    response = jsonify({'success' : False, 'err' : error})
+    response.status_code = 400
+    return response
+
+
+def make_not_acceptable_response(error):
+    """
+        Wraps error about image type not acceptable for client in HTTP response with 406 status code
+
+        :type error: string
+        :param error: error message
+
+        :rtype: flask.wrappers.Response
+        :return: HTTP response containing error
+    """
+    response = jsonify({'success' : False, 'err' : error})
+    response.status_code = 406
+    return response
+
+
+def make_too_large_response(error):
+    """
+        Wraps error about too big upload in HTTP response with 413 status code
+
+        :type error: string
+        :param error: error message
+
+        :rtype: flask.wrappers.Response
+        :return: HTTP response containing error
+    """
+    response = jsonify({'success' : False, 'err' : error})
+    response.status_code = 413
+    return response
+
+
+def read_image(field = 'image'):
+    """
+        Reads uploaded image from formData field of current request without copying it (see decoding.read_upload)
+        and checks number of its pixels against limit of the endpoint before it is decoded. Aborts request with 413 response if image is too big
+        and with error response if its header can not be read
+
+        :type field: string
+        :param field: name of formData field
+
+        :rtype: bytes or mmap.mmap
+        :return: encoded image
+    """
+    file = decoding.read_upload(request.files[field].stream)
+    error, too_large = decoding.check_pixels(file, limits.pixel_limit(request.url_rule.rule))
+    if too_large:
+        abort(make_too_large_response(error))
+    if error:
+        abort(make_error_response(error))
+    return file
+
+
+def read_images(field = 'images'):
+    """
+        Reads all images uploaded in repeated formData field of current request and checks number of their pixels, see read_image.
+        Images which do not pass are reported per image, so the other images are still processed
+
+        :type field: string
+        :param field: name of formData field
+
+        :rtype: [(bytes or mmap.mmap, string)]
+        :return: encoded image and None, or None and error for every image in order of upload
+    """
+    files = [decoding.read_upload(f.stream) for f in request.files.getlist(field)]
+    max_pixels = limits.pixel_limit(request.url_rule.rule)
+    uploads = []
+    for file in files:
+        error, _ = decoding.check_pixels(file, max_pixels)
+        uploads.append((None, error) if error else (file, None))
+    return uploads
+
+
+def process_image_bytes(file, method, params = None, name = None, max_dim = None, output = None, auto_orient = True):
+    """
+        Decodes image, processes it with chosen opencv method and encodes the result.
+        Successful results are stored in result cache under key made from image bytes, method name and parameters.
+        Does not touch flask request, so it can be called from worker threads.
+
+        :type file: bytes or mmap.mmap
+        :param file: bytes stream containing image data
+
+        :type method: function
+        :param method: function to process image with
+
+        :type params: list
+        :param params: parameters passed to method after image
+
+        :type name: string
+        :param name: name identifying method and its parameters in result cache. Defaults to name of method combined with params,
+            results of anonymous functions are not cached
+
+        :type max_dim: int
+        :param max_dim: maximum dimension of processed image. Bigger images are downscaled while decoding and size parameters of method are scaled accordingly
+
+        :type output: (string, int, int)
+        :param output: output format, quality and compression level (see encoding.parse_output). None values are replaced with defaults of the method
+
+        :type auto_orient: bool
+        :param auto_orient: whether image should be rotated according to its EXIF orientation tag while decoding
+
+        :rtype: bytes, string, string, any
+        :return: encoded image (list of encoded images if method returns many images), its mimetype, None and extra data.
+            If image can not be decoded or method fails returns None, None, error and None
+    """
+    key_params = None
+    if name is None:
+        name = getattr(method, '__name__', None)
+        key_params = params
+    if name and name != '<lambda>' and result_cache.enabled:
+        if max_dim or output:
+            name = '%s@%r' % (name, (max_dim, output))
+        if not auto_orient:
+            name = '%s@raw' % name
+        return result_cache.get_or_compute(make_key(file, name, key_params), lambda: _process_image_bytes(file, method, params, max_dim, output, auto_orient))
+    return _process_image_bytes(file, method, params, max_dim, output, auto_orient)
+
+
+def _process_image_bytes(file, method, params, max_dim, output, auto_orient):
+    method_name = getattr(method, '__name__', None)
+    metrics.INPUT_BYTES.labels(method_name).inc(len(file))
+    with metrics.timed(metrics.STAGE_SECONDS, method_name, 'decode'):
+        grayscale = pipeline.input_color_space(method_name, params) == improc.COLOR_GRAY
+        img, scale = decoding.decode_image(file, max_dim, grayscale, auto_orient)
+    if img is None:
+        metrics.ERRORS.labels(method_name).inc()
+        return None, None, "Image could not be decoded", None
+    metrics.INPUT_PIXELS.labels(method_name).inc(img.shape[0] * img.shape[1])
+
+    params = pipeline.scale_params(method_name, params, scale)
+    with metrics.timed(metrics.STAGE_SECONDS, method_name, 'process'):
+        res = tiling.call(method, img, params)
 
-    if params:
-        res = method(img, *params)
-    else:
-        res = method(img)
-    
     if(res[1]):
-        return {'success' : False, 'err' : res[1]}
+        metrics.ERRORS.labels(method_name).inc()
+        return None, None, res[1], None
+
+    extraRes = res[-1] if len(res) > 2 else None
+    fmt, quality, compression = output or (None, None, None)
+    fmt = fmt or encoding.default_format(pipeline.final_method_name(method_name, params))
+    encode = encoding.encode_images if isinstance(res[0], list) else encoding.encode_image
+    with metrics.timed(metrics.STAGE_SECONDS, method_name, 'encode'):
+        encoded, mimetype, error = encode(res[0], fmt, quality, compression)
+    if error:
+        metrics.ERRORS.labels(method_name).inc()
+        return None, None, error, None
+    metrics.OUTPUT_BYTES.labels(method_name).inc(sum(map(len, encoded)) if isinstance(encoded, list) else len(encoded))
+    return encoded, mimetype, None, extraRes
+
+
+def detect_faces_bytes(file, params, max_dim = None):
+    """
+        Decodes image directly to grayscale and detects faces without marking them and encoding the image.
+        Results are stored in result cache.
 
-    extraRes = res[-1]
-    img = Image.fromarray(res[0].astype("uint8"))
-    rawBytes = io.BytesIO()
-    img.save(rawBytes, "JPEG")
-    rawBytes.seek(0)
-    img_base64 = base64.b64encode(rawBytes.read())
+        :type file: bytes or mmap.mmap
+        :param file: bytes stream containing image data
 
-    if(extraRes is not None):
-        return jsonify({'success' : True, 'status':str(img_base64), 'extra' : str(extraRes)})
+        :type params: list
+        :param params: parameters of ImageProcessor.detect_frontal_faces
+
+        :type max_dim: int
+        :param max_dim: maximum dimension of decoded image, see process_image_bytes
+
+        :rtype: bytes, string, string, None
+        :return: json with face coordinates, its mimetype, None and None. If image can not be decoded or detection fails returns None, None, error and None
+    """
+    def detect():
+        img, scale = decoding.decode_image(file, max_dim, grayscale=True)
+        if img is None:
+            return None, None, "Image could not be decoded", None
+        with metrics.timed(metrics.STAGE_SECONDS, 'detect_frontal_faces', 'process'):
+            faces, error = imageprocessor.detect_frontal_faces(img, *pipeline.scale_params('detect_frontal_faces', params, scale))
+        if error:
+            return None, None, error, None
+        return json.dumps({'success' : True, 'faces' : faces, 'scale' : scale}).encode(), RESPONSE_JSON, None, None
+
+    if result_cache.enabled:
+        return result_cache.get_or_compute(make_key(file, 'detect_frontal_faces@%r' % max_dim, params), detect)
+    return detect()
+
+
+def parse_max_dim():
+    """
+        Reads optional 'max_dim' and 'preview' formData fields of current request
+
+        :rtype: int, string
+        :return: maximum dimension of processed image (None if image should be processed at full size) and None. If max_dim is not correct returns None and error
+    """
+    max_dim = request.form.get('max_dim')
+    if max_dim:
+        try:
+            max_dim = int(max_dim)
+        except ValueError:
+            return None, "max_dim should be an integer"
+        if max_dim < 1:
+            return None, "max_dim should be positive"
     else:
-        a = jsonify({'success' : True, 'status':str(img_base64)})
-        print(type(a))
-        return jsonify({'success' : True, 'status':str(img_base64)})
+        max_dim = None
+    if request.form.get('preview', '').lower() in ('1', 'true', 'yes'):
+        max_dim = min(max_dim or decoding.PREVIEW_MAX_DIM, decoding.PREVIEW_MAX_DIM)
+    return max_dim, None
 
-class HomePage(Resource):
+
+def parse_output():
     """
-        API endpoint to load homepage
+        Reads optional 'format', 'quality' and 'compression' formData fields of current request.
+        Without 'format' field, format is taken from image type in Accept header ('image/*' keeps default format of the method).
+        Aborts with 406 response if client does not accept format given in 'format' field.
+
+        :rtype: (string, int, int), string
+        :return: output options (see encoding.parse_output) and None. If options are not correct returns None and error
     """
-    def get(self):
-        """
-            GET /
+    output, error = encoding.parse_output(request.form.get('format'), request.form.get('quality'), request.form.get('compression'))
+    if error or negotiate_response_mode() != RESPONSE_IMAGE:
+        return output, error
+    fmt, quality, compression = output
+    if fmt:
+        mimetype = encoding.FORMATS[fmt][1]
+        if not request.accept_mimetypes.quality(mimetype):
+            abort(make_not_acceptable_response("Format %s (%s) is not accepted by client" % (fmt, mimetype)))
+        return output, None
+    best = request.accept_mimetypes.best_match(RESPONSE_MIMETYPES)
+    for name, (_, mimetype, _, _, _) in encoding.FORMATS.items():
+        if mimetype == best:
+            return (name, quality, compression), None
+    return output, None
+
+
+def parse_auto_orient():
+    """
+        Reads optional 'auto_orient' formData field of current request
 
-            :rtype: HTTP Response
-            :return: renders and returns homepage
-        """
-        return make_response(render_template('index.html'))
+        :rtype: bool
+        :return: False if client asked to ignore EXIF orientation of an image, True otherwise
+    """
+    return request.form.get('auto_orient', '').lower() not in ('0', 'false', 'no')
 
-class Grayscale(Resource):
+
+def async_requested():
     """
-        API endpoint for grayscale method
+        Checks whether client asked for asynchronous processing with 'async' formData field or 'Prefer: respond-async' header
+
+        :rtype: bool
+        :return: True if job should be processed asynchronously
     """
-    def get(self):
-        """
-            GET /
+    if request.form.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
 
-            :rtype: HTTP Response
-            :return: renders and returns grayscale page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Grayscale", 
-            endpoint = "/gray", 
-            var1="none", var1Name = "",
-            var2="none", var2Name = "",
-            var3="none", var3Name = "",
-            var4="none", var4Name = "",))
-    def post(self):
-        """
-            POST /grey
 
-            :param request.files['image']: formData field containing image
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTML response
-        """
-        return image_process(request.files['image'].read(), imageprocessor.to_grayscale)
+def admit(cost):
+    """
+        Admits current request in admission control (see admission.py). Aborts request with 429 response and Retry-After header
+        if the worker is overloaded. Caller has to release admitted cost with admission.admission_controller.release
+
+        :type cost: float
+        :param cost: estimated cost of request (see admission.estimate_cost)
 
-class Median(Resource):
+        :rtype: string
+        :return: lane of admitted request
     """
-        API endpoint for median blur method
+    lane, retry_after = admission.admission_controller.acquire(cost)
+    if lane is None:
+        abort(make_overloaded_response(retry_after))
+    return lane
+
+
+def make_overloaded_response(retry_after):
     """
-    def get(self):
-        """
-            GET /
+        :type retry_after: int
+        :param retry_after: number of seconds after which request should be retried
 
-            :rtype: HTTP Response
-            :return: renders and returns median page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Median", 
-            endpoint = "/median", 
-            var1="block", var1Name="ksize", 
-            var2="none", var2Name = "",
-            var3="none", var3Name = "",
-            var4="none", var4Name = "",))
-    def post(self):
-        """
-            POST /grey
+        :rtype: flask.wrappers.Response
+        :return: 429 response with Retry-After header
+    """
+    response = jsonify({'success' : False, 'err' : "Server is overloaded, try again later"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing ksize parameter
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
-        """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.median_blur), [int(request.form['ksize'])])
 
-class Average(Resource):
+def run_admitted(cost, function):
     """
-        API endpoint for average blur method
+        Runs function when admission control has budget for it. Waits as long as needed instead of rejecting,
+        it is used by asynchronous jobs whose number is already bounded by job queue
+
+        :type cost: float
+        :param cost: estimated cost of function (see admission.estimate_cost)
+
+        :type function: function
+        :param function: function without parameters
+
+        :return: result of function
     """
-    def get(self):
-        """
-            GET /average
+    lane, _ = admission.admission_controller.acquire(cost, block=True)
+    try:
+        return function()
+    finally:
+        admission.admission_controller.release(lane, cost)
 
-            :rtype: HTTP Response
-            :return: renders and returns average blur page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Average", 
-            endpoint = "/average", 
-            var1="block", var1Name="ksize_x", 
-            var2="block", var2Name="ksize_y",
-            var3="none", var3Name = "",
-            var4="none", var4Name = "",))
-    def post(self):
-        """
-            POST /average
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing ksize_x and ksize_y parameters
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
-        """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.average_blur), [int(request.form['ksize_x']), int(request.form['ksize_y'])])
+def submit_job(function):
+    """
+        Schedules processing on job worker pool
+
+        :type function: function
+        :param function: function without parameters returning result of process_image_bytes
 
-class GaussianBlur(Resource):
+        :rtype: flask.wrappers.Response
+        :return: HTTP 202 response with job id and its location or 429 response if job queue is full
     """
-        API endpoint for gaussian blur method
+    job, error = jobs.job_manager.submit(function)
+    if error:
+        response = jsonify({'success' : False, 'err' : error})
+        response.status_code = 429
+        response.headers['Retry-After'] = '1'
+        return response
+    location = '/jobs/%s' % job.id
+    response = jsonify({'success' : True, 'job' : job.id, 'state' : job.state, 'location' : location})
+    response.status_code = 202
+    response.headers['Location'] = location
+    return response
+
+
+def image_process(file, method, params = None, name = None):
+
     """
-    def get(self):
-        """
-            GET /gauss
+        Function that processes image with chosen opencv method.
 
-            :rtype: HTTP Response
-            :return: renders and returns average page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Gaussian Blur", 
-            endpoint = "/gauss", 
-            var1="block", var1Name="ksize_x", 
-            var2="block", var2Name="ksize_y",
-            var3="none", var3Name = "",
-            var4="none", var4Name = "",))
-    def post(self):
-        """
-            POST /gauss
+        :type file: bytes or mmap.mmap
+        :param function: bytes stream containing image data
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing ksize_x and ksize_y parameters
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
-        """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.gaussian_blur), [int(request.form['ksize_x']), int(request.form['ksize_y'])])
+        :type method: funtion
+        :param function: function to process image with
+
+        :type name: string
+        :param name: name identifying method in result cache, see process_image_bytes
+
+        :rtype: flask.wrappers.Response
+        :return: HTTP response negotiated with client (see make_image_response) - json with process information, raw image or multipart body.
+            If asynchronous mode is requested returns job id instead (see submit_job).
+    """
+
+    max_dim, error = parse_max_dim()
+    if error:
+        return make_error_response(error)
+    output, error = parse_output()
+    if error:
+        return make_error_response(error)
+
+    auto_orient = parse_auto_orient()
+
+    method_name = getattr(method, '__name__', None)
+    cost = admission.estimate_cost(file, method_name, params or [], max_dim)
+    if async_requested():
+        return submit_job(lambda: run_admitted(cost, lambda: process_image_bytes(file, method, params, name, max_dim, output, auto_orient)))
+
+    lane = admit(cost)
+    try:
+        with metrics.timed(metrics.REQUEST_SECONDS, method_name):
+            encoded, mimetype, error, extraRes = process_image_bytes(file, method, params, name, max_dim, output, auto_orient)
+            if error:
+                return make_error_response(error)
+            with metrics.timed(metrics.STAGE_SECONDS, method_name, 'response'):
+                return make_image_response(encoded, mimetype, extraRes)
+    finally:
+        admission.admission_controller.release(lane, cost)
 
-class Bilateral(Resource):
+class HomePage(Resource):
     """
-        API endpoint for bilateral method
+        API endpoint to load homepage
     """
     def get(self):
         """
-            GET /bilateral
+            GET /
 
             :rtype: HTTP Response
-            :return: renders and returns bilateral page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Bilateral filter", 
-            endpoint = "/bilateral", 
-            var1="block",  var1Name="d", 
-            var2="block", var2Name="sigma",
-            var3="none",
-            var4="none"))
-    def post(self):
-        """
-            POST /gauss
-
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing d and sigma parameters
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: renders and returns homepage
         """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.bilateral_filter), [int(request.form['d']), float(request.form['sigma'])])
+        return make_response(render_template('index.html', methods=registry.METHODS))
 
-class GlobalThresh(Resource):
+def method_resource(spec):
     """
-        API endpoint for global threshold method
+        Creates API endpoint of method declared in registry. GET renders method page, POST parses and validates parameters
+        (before the image is decoded) and processes uploaded image
+
+        :type spec: registry.MethodSpec
+        :param spec: declaration of method
+
+        :rtype: type
+        :return: Resource class named spec.resource
     """
     def get(self):
         """
-            GET /thresh/global
-
-            :rtype: HTTP Response
-            :return: renders and returns global threshold page
+            Renders and returns method page
         """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Global threshold", 
-            endpoint = "/thresh/global", 
-            var1="block", var1Name="threshold", 
-            var2="block", var2Name="value",
-            var3="none",
-            var4="none"))
+        return make_response(render_template('methodPage.html', methodName=spec.title, endpoint=spec.paths[0], params=spec.params))
+
     def post(self):
         """
-            POST /thresh/global
-
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing threshold and value parameters
-            :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            Processes image sent in 'image' formData field with parameters sent in other formData fields (see /openapi.json).
+            Methods with sweep accept 'sweep' field and return many images
         """
-        return image_process(request.files['image'].read(), imageprocessor.global_threshold, [int(request.form['threshold']), int(request.form['value'])])
+        method, params, error = registry.parse_request(spec, request.form, imageprocessor)
+        if error:
+            return make_error_response(error)
+        return image_process(read_image(), method, params)
 
-class MeanThreshold(Resource):
+    return type(spec.resource, (Resource,), {'__doc__': "API endpoint for %s method" % spec.title, 'get': get, 'post': post})
+
+
+class FrontalFace(method_resource(registry.STEPS['frontal'])):
     """
-        API endpoint for mean threshold method
+        API endpoint for frontal method
     """
-    def get(self):
-        """
-            GET /thresh/mean
-
-            :rtype: HTTP Response
-            :return: renders and returns mean threshold page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Mean threshold", 
-            endpoint = "/thresh/mean", 
-            var1="block", var1Name="blocksize", 
-            var2="block", var2Name="c",
-            var3="block", var3Name="value",
-            var4="none"))
     def post(self):
         """
-            POST /thresh/mean
+            POST /frontal
 
             :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing blocksize, c and value parameters
+            :param request.form: formData fields containing min_neighbours and scale parameters, optional min_size, max_size, max_detection_dim and cascade parameters
+                and optional mode parameter - 'coordinates' returns only json with face coordinates, without marking and encoding the image
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: returns processed image along with detected face coordinates wrapped in HTTP response
         """
-        return image_process(request.files['image'].read(), imageprocessor.mean_threshold, [int(request.form['blocksize']), float(request.form['c']), int(request.form['value'])])
-
-class GaussianThreshold(Resource):
+        if request.form.get('mode') != 'coordinates':
+            return super().post()
+        params, error = registry.parse_params(registry.STEPS['frontal'], request.form)
+        if error:
+            return make_error_response(error)
+        error = imageprocessor.validate_detect_frontal_faces(*params)
+        if error:
+            return make_error_response(error)
+        max_dim, error = parse_max_dim()
+        if error:
+            return make_error_response(error)
+        file = read_image()
+        cost = admission.estimate_cost(file, 'detect_frontal_faces', params, max_dim)
+        lane = admit(cost)
+        try:
+            encoded, mimetype, error, _ = detect_faces_bytes(file, params, max_dim)
+        finally:
+            admission.admission_controller.release(lane, cost)
+        if error:
+            return make_error_response(error)
+        return Response(encoded, mimetype=mimetype)
+
+
+class FrontalFaceBatch(Resource):
     """
-        API endpoint for gaussian threshold method
+        API endpoint detecting faces on many images in one request. Only coordinates are returned
     """
-    def get(self):
+    def post(self):
         """
-            GET /thresh/gauss
+            POST /frontal/batch
 
-            :rtype: HTTP Response
-            :return: renders and returns gaussian threshold page
+            :param request.files['images']: formData fields containing images
+            :param request.form: formData fields containing parameters of face detection (see /frontal)
+            :rtype: flask.wrappers.Response
+            :return: returns json with list of results in order of upload, each containing face coordinates or error
         """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Gaussian threshold", 
-            endpoint = "/thresh/gauss", 
-            var1="block", var1Name="blocksize", 
-            var2="block", var2Name="c",
-            var3="block", var3Name="value",
-            var4="none"))
+        params, error = registry.parse_params(registry.STEPS['frontal'], request.form)
+        if not error:
+            error = imageprocessor.validate_detect_frontal_faces(*params)
+        if error:
+            return make_error_response(error)
+        max_dim, error = parse_max_dim()
+        if error:
+            return make_error_response(error)
+        uploads = read_images()
+        if not uploads:
+            return make_error_response("No images provided in 'images' field")
+
+        cost = sum(admission.estimate_cost(file, 'detect_frontal_faces', params, max_dim) for file, error in uploads if not error)
+        lane = admit(cost)
+        try:
+            results = batch.process_batch(uploads, lambda upload: (None, None, upload[1], None) if upload[1] else detect_faces_bytes(upload[0], params, max_dim))
+        finally:
+            admission.admission_controller.release(lane, cost)
+
+        items = []
+        for encoded, _, error, _ in results:
+            items.append({'success' : False, 'err' : error} if error else json.loads(encoded))
+        return jsonify({'success' : True, 'results' : items})
+
+class Pipeline(Resource):
+    """
+        API endpoint for chained processing. Image is decoded once, processed by every step and encoded once
+    """
     def post(self):
         """
-            POST /thresh/gauss
+            POST /pipeline
 
             :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing blocksize, c and value parameters
+            :param request.form: formData field 'steps' containing json list of steps, for example [{"method": "gray"}, {"method": "canny", "params": {"threshold1": 50, "threshold2": 150}}]
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: returns processed image along with extra data returned by steps wrapped in HTTP response
         """
-        return image_process(request.files['image'].read(), imageprocessor.gaussian_threshold, [int(request.form['blocksize']), float(request.form['c']), int(request.form['value'])])
+        steps, error = pipeline.parse_steps(request.form.get('steps'), imageprocessor)
+        if error:
+            return make_error_response(error)
+        return image_process(read_image(), pipeline.run_pipeline, [steps], name=pipeline.describe_steps(steps))
 
-class Sobel(Resource):
+class Batch(Resource):
     """
-        API endpoint for sobel method
+        API endpoint processing many images in one request. Images are processed in parallel on a thread pool
     """
-    def get(self):
-        """
-            GET /sobel
-
-            :rtype: HTTP Response
-            :return: renders and returns sobel page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Sobel", 
-            endpoint = "/sobel", 
-            var1="block", var1Name="dx", 
-            var2="block", var2Name="dy",
-            var3="block", var3Name="ksize",
-            var4="block", var4Name="delta"))
     def post(self):
         """
-            POST /sobel
+            POST /batch
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing dx, dy, ksize and delta parameters
+            :param request.files['images']: formData fields containing images
+            :param request.form: formData field 'steps' containing json list of steps (see /pipeline). Single method is a one step pipeline
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: returns processed images in order of upload. JSON mode returns list of results in the same format as single method endpoints,
+                multipart mode returns one part per image (error json for images that failed)
         """
-        return image_process(request.files['image'].read(), imageprocessor.sobel, [int(request.form['dx']), int(request.form['dy']), int(request.form['ksize']), float(request.form['delta'])])
-
-class Laplacian(Resource):
+        steps, error = pipeline.parse_steps(request.form.get('steps'), imageprocessor)
+        if error:
+            return make_error_response(error)
+        max_dim, error = parse_max_dim()
+        if error:
+            return make_error_response(error)
+        output, error = parse_output()
+        if error:
+            return make_error_response(error)
+        uploads = read_images()
+        if not uploads:
+            return make_error_response("No images provided in 'images' field")
+
+        method = pipeline.run_pipeline
+        name = pipeline.describe_steps(steps)
+        auto_orient = parse_auto_orient()
+        cost = sum(admission.estimate_cost(file, 'run_pipeline', [steps], max_dim) for file, error in uploads if not error)
+        lane = admit(cost)
+        try:
+            results = batch.process_batch(uploads, lambda upload: (None, None, upload[1], None) if upload[1]
+                else process_image_bytes(upload[0], method, [steps], name, max_dim, output, auto_orient))
+        finally:
+            admission.admission_controller.release(lane, cost)
+
+        if negotiate_response_mode() == RESPONSE_MULTIPART:
+            parts = []
+            for encoded, mimetype, error, extra in results:
+                if error:
+                    parts.append(('application/json', json.dumps({'success' : False, 'err' : error}).encode()))
+                else:
+                    parts.append((mimetype, encoded))
+            return make_multipart_response(parts)
+
+        items = []
+        for encoded, mimetype, error, extra in results:
+            if error:
+                items.append({'success' : False, 'err' : error})
+                continue
+            item = {'success' : True, 'status' : str(base64.b64encode(encoded)), 'mimetype' : mimetype}
+            if extra is not None:
+                item['extra'] = extra_to_json(extra)
+            items.append(item)
+        return jsonify({'success' : True, 'results' : items})
+
+class OpenApi(Resource):
     """
-        API endpoint for laplacian method
+        API endpoint describing method endpoints, /pipeline and /batch in OpenAPI format
     """
     def get(self):
         """
-            GET /laplacian
+            GET /openapi.json
 
-            :rtype: HTTP Response
-            :return: renders and returns laplacian page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Laplacian", 
-            endpoint = "/laplacian", 
-            var1="block", var1Name="ksize", 
-            var2="block", var2Name="delta",
-            var3="none",
-            var4="none"))
-    def post(self):
-        """
-            POST /laplacian
-
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing ksize and delta parameters
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: OpenAPI 3 document generated from registry
         """
-        return image_process(request.files['image'].read(), imageprocessor.laplacian, [int(request.form['ksize']), float(request.form['delta'])])
+        return jsonify(registry.openapi(REQUEST_OPTIONS))
 
-class Canny(Resource):
+class CacheStats(Resource):
     """
-        API endpoint for canny method
+        API endpoint exposing result cache counters
     """
     def get(self):
         """
-            GET /canny
-
-            :rtype: HTTP Response
-            :return: renders and returns canny page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Canny", 
-            endpoint = "/canny", 
-            var1="block", var1Name="threshold1", 
-            var2="block", var2Name="threshold2",
-            var3="none",
-            var4="none"))
-    def post(self):
-        """
-            POST /canny
+            GET /cache/stats
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing threshold and threshold2 parameters
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: json with hits, misses, coalesced requests, evictions and size of result cache
         """
-        return image_process(request.files['image'].read(), imageprocessor.canny_edge_detection, [int(request.form['threshold1']), int(request.form['threshold2'])])
+        return jsonify(result_cache.stats())
 
-class FrontalFace(Resource):
+class Job(Resource):
     """
-        API endpoint for frontal method
+        API endpoint for asynchronous jobs
     """
-    def get(self):
+    def get(self, job_id):
         """
-            GET /frontal
+            GET /jobs/<job_id>
 
-            :rtype: HTTP Response
-            :return: renders and returns frontal face page
+            :param request.args['wait']: optional number of seconds to wait for job to finish (long polling)
+            :rtype: flask.wrappers.Response
+            :return: returns processed image (in the same format as method endpoint) if job is finished,
+                json with job state and 202 status code if it is not, 404 if job does not exist, expired or was cancelled
         """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Frontal face detection", 
-            endpoint = "/frontal", 
-            var1="block", var1Name="min_neighbours", 
-            var2="block", var2Name="scale",
-            var3="none",
-            var4="none"))
-    def post(self):
+        try:
+            wait = min(float(request.args.get('wait', 0)), jobs.MAX_WAIT)
+        except ValueError:
+            return make_error_response("wait should be a number")
+        job = jobs.job_manager.get(job_id, wait)
+        if job is None or job.state == jobs.JOB_CANCELLED:
+            response = jsonify({'success' : False, 'err' : "Job does not exist"})
+            response.status_code = 404
+            return response
+        if job.state != jobs.JOB_DONE:
+            response = jsonify({'success' : True, 'job' : job.id, 'state' : job.state})
+            response.status_code = 202
+            return response
+        if job.result is None:
+            response = jsonify({'success' : False, 'err' : "Server error, job failed"})
+            response.status_code = 500
+            return response
+        encoded, mimetype, error, extra = job.result
+        if error:
+            return make_error_response(error)
+        return make_image_response(encoded, mimetype, extra)
+
+    def delete(self, job_id):
         """
-            POST /frontal
+            DELETE /jobs/<job_id>
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing min_neighbours and scale parameters
             :rtype: flask.wrappers.Response
-            :return: returns processed image along with detected face coordinates wrapped in HTTP response
+            :return: json with success flag set to True if job was cancelled, 404 if job does not exist or already finished
         """
-        return image_process(request.files['image'].read(), bgr2rgb_3_params(imageprocessor.haar_frontal_face_detection), [int(request.form['min_neighbours']), float(request.form['scale'])])
+        if jobs.job_manager.cancel(job_id):
+            return jsonify({'success' : True, 'job' : job_id, 'state' : jobs.JOB_CANCELLED})
+        response = jsonify({'success' : False, 'err' : "Job does not exist or is already finished"})
+        response.status_code = 404
+        return response
 
-class RotationNaive(Resource):
+class Video(Resource):
     """
-        API endpoint for naive rotation method
+        API endpoint processing every frame of a video or MJPEG stream. Frames are decoded one by one,
+        processed on a small worker pool and streamed back in order, so memory usage does not depend on length of the video
     """
-    def get(self):
-        """
-            GET /rotation/naive
-
-            :rtype: HTTP Response
-            :return: renders and returns naive rotation page
-        """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Naive rotation", 
-            endpoint = "/rotation/naive", 
-            var1="block", var1Name="angle", 
-            var2="none",
-            var3="none",
-            var4="none"))
     def post(self):
         """
-            POST /rotation/naive
+            POST /video
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing angle parameter
+            Video file is sent in 'video' formData field, parameters in other formData fields.
+            MJPEG stream can be sent as raw request body (Content-Type multipart/x-mixed-replace, video/x-motion-jpeg or image/jpeg), parameters are then read from query string.
+
+            :param steps: json list of steps (see /pipeline)
+            :param output: 'mjpeg' (default) - multipart/x-mixed-replace stream of JPEG frames, extra data is sent in X-Extra header of each part,
+                'avi' - MJPG encoded AVI file
+            :param fps: frame rate of output video when it can not be read from input (default 25)
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: returns processed frames wrapped in streamed HTTP response
         """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.naive_rotate), [int(request.form['angle'])])
-
-class Rotation(Resource):
+        raw = request.mimetype != 'multipart/form-data'
+        args = request.args if raw else request.form
+        steps, error = pipeline.parse_steps(args.get('steps'), imageprocessor)
+        if error:
+            return make_error_response(error)
+        output = args.get('output', 'mjpeg')
+        if output not in ('mjpeg', 'avi'):
+            return make_error_response("output should be mjpeg or avi")
+        try:
+            fps = float(args.get('fps', 25))
+        except ValueError:
+            return make_error_response("fps should be a number")
+
+        spooled = None
+        if raw:
+            source = video.mjpeg_frames(request.stream, pipeline.input_color_space('run_pipeline', [steps]) == improc.COLOR_GRAY)
+        else:
+            if 'video' not in request.files:
+                return make_error_response("No video provided in 'video' field")
+            path, copied = video.upload_path(request.files['video'].stream)
+            spooled = path if copied else None
+            source = video.capture_frames(path)
+
+        def cleanup():
+            # generators that were never iterated do not run their finally blocks when closed, so the source is closed
+            # and the spooled copy of the upload removed explicitly
+            source.close()
+            if spooled:
+                video.remove_file(spooled)
+
+        streaming = False
+        try:
+            if not raw:
+                fps = video.capture_fps(path, fps)
+
+            # the stream holds admission budget of a window of frames processed at once, estimated from size of the first frame
+            first, frames = video.peek(source)
+            cost = admission.method_cost('run_pipeline', [steps], first.shape[0] * first.shape[1] / 1e6) * video.VIDEO_WINDOW if first is not None else 0.0
+            lane, retry_after = admission.admission_controller.acquire(cost)
+            if lane is None:
+                return make_overloaded_response(retry_after)
+
+            if output == 'avi':
+                try:
+                    result_path, error = video.write_video(video.process_ordered(frames, lambda frame: pipeline.run_pipeline(frame, steps)), fps)
+                finally:
+                    admission.admission_controller.release(lane, cost)
+                if error:
+                    return make_error_response(error)
+                # removed on close, a body that is never iterated would not remove it
+                response = Response(video.file_chunks(result_path, remove=False), mimetype='video/x-msvideo')
+                response.call_on_close(lambda: video.remove_file(result_path))
+                return response
+
+            def process_frame(frame):
+                image, error, extra = pipeline.run_pipeline(frame, steps)
+                if error:
+                    return None, error, None
+                encoded, _, error = encoding.encode_image(image, 'jpeg')
+                return encoded, error, extra
+
+            def close_stream():
+                admission.admission_controller.release(lane, cost)
+                cleanup()
+
+            boundary = uuid.uuid4().hex
+            body = video.mjpeg_body(video.process_ordered(frames, process_frame), boundary, 'image/jpeg', lambda extra: json.dumps(extra_to_json(extra)))
+            response = Response(stream_with_context(body), mimetype='multipart/x-mixed-replace; boundary=%s' % boundary)
+            response.call_on_close(close_stream)
+            streaming = True
+            return response
+        finally:
+            if not streaming:
+                cleanup()
+
+class Metrics(Resource):
     """
-        API endpoint for rotation method
+        API endpoint exposing metrics in Prometheus text format
     """
     def get(self):
         """
-            GET /rotation
+            GET /metrics
 
-            :rtype: HTTP Response
-            :return: renders and returns rotation page
+            :rtype: flask.wrappers.Response
+            :return: per method and per stage latency histograms, counters of input pixels, input and output bytes and errors
         """
-        return make_response(render_template(
-            'methodPage.html', 
-            methodName="Rotation", 
-            endpoint = "/rotation", 
-            var1="block", var1Name="angle", 
-            var2="none",
-            var3="none",
-            var4="none"))
-    def post(self):
+        data, content_type = metrics.render()
+        return Response(data, content_type=content_type)
+
+class Ready(Resource):
+    """
+        API endpoint for readiness checks
+    """
+    def get(self):
         """
-            POST /rotation
+            GET /ready
 
-            :param request.files['image']: formData field containing image
-            :param request.form: formData fields containing angle parameter
             :rtype: flask.wrappers.Response
-            :return: returns processed image wrapped in HTTP response
+            :return: json with readiness flag, state of haar cascades (path, load time, load error) and admission control counters. 503 status code if default cascade can not be loaded
         """
-        return image_process(request.files['image'].read(), bgr2rgb_2_params(imageprocessor.rotate), [int(request.form['angle'])])
+        _, error = imageprocessor.cascades.get(improc.DEFAULT_CASCADE)
+        response = jsonify({'ready' : error is None, 'cascades' : imageprocessor.cascades.status(), 'admission' : admission.admission_controller.stats()})
+        if error:
+            response.status_code = 503
+        return response
+
+
+@app.before_request
+def before_request():
+    """
+        Rejects requests with body bigger than limit of the endpoint (see limits.py) before the body is read
+    """
+    if request.url_rule is None or request.content_length is None:
+        return None
+    limit = limits.body_limit(request.url_rule.rule)
+    if request.content_length > limit:
+        return make_too_large_response("Request body has %d bytes, at most %d bytes are allowed" % (request.content_length, limit))
+    return None
 
 
 @app.after_request
@@ -524,23 +1009,23 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Extra,Location,Retry-After')
     return response
 
 api.add_resource(HomePage, "/")
-api.add_resource(Grayscale, "/gray")
-api.add_resource(Median, "/median")
-api.add_resource(Average, "/average")
-api.add_resource(GaussianBlur, "/gauss")
-api.add_resource(Bilateral, "/bilateral")
-api.add_resource(GlobalThresh, "/thresh/global")
-api.add_resource(MeanThreshold, "/thresh/mean")
-api.add_resource(GaussianThreshold, "/thresh/gauss")
-api.add_resource(Sobel, "/sobel")
-api.add_resource(Laplacian,"/laplacian")
-api.add_resource(Canny, "/canny")
-api.add_resource(FrontalFace, "/frontal")
-api.add_resource(RotationNaive, "/rotation/naive")
-api.add_resource(Rotation, "/rotation")
+# endpoints of methods declared in registry, methods with extra modes have their own classes
+METHOD_RESOURCES = {'frontal': FrontalFace}
+for spec in registry.METHODS:
+    api.add_resource(METHOD_RESOURCES.get(spec.step) or method_resource(spec), *spec.paths)
+api.add_resource(FrontalFaceBatch, "/frontal/batch", "/detect/batch")
+api.add_resource(Pipeline, "/pipeline")
+api.add_resource(Batch, "/batch")
+api.add_resource(CacheStats, "/cache/stats")
+api.add_resource(Job, "/jobs/<string:job_id>")
+api.add_resource(Video, "/video")
+api.add_resource(Metrics, "/metrics")
+api.add_resource(Ready, "/ready")
+api.add_resource(OpenApi, "/openapi.json")
 
 if __name__ == "__main__":
     app.run(debug=True)
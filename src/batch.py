@@ -0,0 +1,25 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# OpenCV releases GIL inside its functions, so threads give real parallelism for decoding, processing and encoding
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+
+executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+
+def process_batch(items, function):
+    """
+    Processes items in parallel on shared thread pool
+
+    :type items: list
+    :param items: items to process (for example bytes of uploaded images)
+
+    :type function: function
+    :param function: function called with each item. Should report errors in its result instead of raising
+
+    :rtype: list
+    :return: Results in the same order as items
+    """
+
+    futures = [executor.submit(function, item) for item in items]
+    return [future.result() for future in futures]
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+# when on-disk store exceeds its budget, oldest files are removed until it takes this fraction of the budget,
+# so the directory is not scanned again on the next put
+DISK_EVICT_RATIO = 0.9
+
+
+def make_key(file, name, params = None):
+    """
+    Creates content addressed cache key
+
+    :type file: bytes
+    :param file: uploaded image bytes
+
+    :type name: string
+    :param name: name of processing method (or canonical description of pipeline)
+
+    :type params: list
+    :param params: parsed parameters of method
+
+    :rtype: string
+    :return: hex digest identifying result
+    """
+
+    digest = hashlib.sha256(file)
+    digest.update(b'\0' + name.encode() + b'\0' + repr(list(params or [])).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    In-process cache of encoded results with LRU eviction bounded by size of stored bytes.
+    Concurrent requests for the same key are coalesced - result is computed only once and other requests wait for it.
+    Optionally results are also stored in a local directory, so they can be shared between gunicorn workers.
+    """
+
+    def __init__(self, max_bytes : int, directory : str = None, max_disk_bytes : int = 0):
+        """
+        :type max_bytes: int
+        :param max_bytes: Memory budget for stored results. 0 disables memory cache
+
+        :type directory: string
+        :param directory: Directory of on-disk store shared between workers. None disables disk store
+
+        :type max_disk_bytes: int
+        :param max_disk_bytes: Budget of on-disk store. Least recently used files are removed when it is exceeded
+        """
+
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        # estimated size of on-disk store: counted at eviction and increased by results stored by this process, None until first put
+        self.disk_size = None
+        self.disk_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or self.directory is not None
+
+    def get_or_compute(self, key : str, compute):
+        """
+        Returns cached result or computes it. Only successful results are stored.
+
+        :type key: string
+        :param key: key created with make_key
+
+        :type compute: function
+        :param compute: function without parameters returning (encoded, mimetype, error, extra) tuple
+
+        :rtype: bytes, string, string, any
+        :return: result of compute
+        """
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            flight = self.in_flight.get(key)
+            if flight is None:
+                flight = self.in_flight[key] = {'event': threading.Event(), 'result': None}
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            flight['event'].wait()
+            if flight['result'] is not None:
+                return flight['result']
+            # owner failed with exception, compute on our own
+            return compute()
+
+        result = None
+        try:
+            result = self._disk_get(key)
+            if result is not None:
+                with self.lock:
+                    self.disk_hits += 1
+            else:
+                with self.lock:
+                    self.misses += 1
+                result = compute()
+                if not result[2]:
+                    self._disk_put(key, result)
+            if not result[2]:
+                self._put(key, result)
+            return result
+        finally:
+            with self.lock:
+                flight['result'] = result
+                del self.in_flight[key]
+            flight['event'].set()
+
+    def _put(self, key, result):
+        encoded = result[0]
+        size = (sum(map(len, encoded)) if isinstance(encoded, list) else len(encoded)) + len(key)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _disk_get(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                encoded, mimetype, extra = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # modification time orders files for eviction, so hits keep the file
+        try:
+            os.utime(self._disk_path(key))
+        except OSError:
+            pass
+        return encoded, mimetype, None, extra
+
+    def _disk_put(self, key, result):
+        if not self.directory:
+            return
+        encoded, mimetype, _, extra = result
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to temporary file and rename, so other workers never read partially written result
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((encoded, mimetype, extra), f)
+                size = f.tell()
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self.lock:
+            over = self.disk_size is None or self.disk_size + size > self.max_disk_bytes
+            if not over:
+                self.disk_size += size
+        if over:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        """
+        Scans the on-disk store and removes least recently used files until it takes DISK_EVICT_RATIO of its budget.
+        Results stored by other processes are counted only by the scan, so the store may temporarily exceed the budget by them
+        """
+
+        if not self.disk_lock.acquire(blocking=False):
+            return
+        try:
+            self._disk_scan_and_evict()
+        finally:
+            self.disk_lock.release()
+
+    def _disk_scan_and_evict(self):
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total > self.max_disk_bytes:
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_disk_bytes * DISK_EVICT_RATIO:
+                    break
+        with self.lock:
+            self.disk_size = total
+
+    def stats(self):
+        """
+        Returns cache counters
+
+        :rtype: dict
+        :return: hits, disk hits, misses, coalesced requests, evictions, number of entries, stored bytes and estimated size of on-disk store
+        """
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'disk_bytes': self.disk_size,
+                'directory': self.directory,
+            }
+
+
+result_cache = ResultCache(
+    int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024)),
+    os.environ.get('RESULT_CACHE_DIR') or None,
+    int(os.environ.get('RESULT_CACHE_DISK_BYTES', 1024 * 1024 * 1024)))
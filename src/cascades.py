@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from cv2 import cv2
+
+ASSETS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'FaceDetectionAssets')
+
+# short names of commonly used cascades
+ALIASES = {
+    'frontal': 'frontalface_default',
+    'profile': 'profileface',
+    'eyes': 'eye',
+    'smile': 'smile',
+    'fullbody': 'fullbody',
+    'upperbody': 'upperbody',
+}
+
+
+def default_directories():
+    """
+    Returns directories searched for cascades - FaceDetectionAssets first, then cascades bundled with opencv-python (if present)
+
+    :rtype: [string]
+    :return: list of directories
+    """
+
+    directories = [ASSETS_DIRECTORY]
+    data = getattr(cv2, 'data', None)
+    if data is not None and getattr(data, 'haarcascades', None):
+        directories.append(data.haarcascades)
+    return directories
+
+
+class CascadeRegistry:
+    """
+    Registry of haar cascades found in cascade directories. Classifiers are loaded lazily, separately for every thread,
+    so detections can run concurrently without locks. Load times and failures are recorded for readiness checks.
+    """
+
+    def __init__(self, directories = None):
+        """
+        :type directories: [string]
+        :param directories: Directories searched for haarcascade_*.xml files. Earlier directories take precedence
+        """
+
+        self.paths = {}
+        for directory in reversed(directories or default_directories()):
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                if filename.startswith('haarcascade_') and filename.endswith('.xml'):
+                    self.paths[filename[len('haarcascade_'):-len('.xml')]] = os.path.join(directory, filename)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.load_seconds = {}
+        self.load_count = {}
+        self.errors = {}
+
+    def resolve(self, name : str):
+        """
+        Resolves alias of cascade
+
+        :type name: string
+        :param name: Name or alias of cascade
+
+        :rtype: string
+        :return: Name of cascade or None if it does not exist
+        """
+
+        name = ALIASES.get(name, name)
+        return name if name in self.paths else None
+
+    def names(self):
+        """
+        :rtype: [string]
+        :return: Names of available cascades and aliases
+        """
+
+        return sorted(set(self.paths) | {alias for alias, name in ALIASES.items() if name in self.paths})
+
+    def get(self, name : str):
+        """
+        Returns classifier owned by current thread, loads it if necessary
+
+        :type name: string
+        :param name: Name or alias of cascade
+
+        :rtype: cv2.CascadeClassifier, string
+        :return: Classifier and None. If cascade does not exist or can not be loaded returns None and error
+        """
+
+        resolved = self.resolve(name)
+        if resolved is None:
+            return None, "Unknown cascade %s, available cascades: %s" % (name, ", ".join(self.names()))
+        classifiers = getattr(self.local, 'classifiers', None)
+        if classifiers is None:
+            classifiers = self.local.classifiers = {}
+        if resolved in classifiers:
+            return classifiers[resolved], None
+
+        start = time.perf_counter()
+        classifier = cv2.CascadeClassifier()
+        try:
+            loaded = classifier.load(self.paths[resolved]) and not classifier.empty()
+        except cv2.error:
+            loaded = False
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            if not loaded:
+                self.errors[resolved] = "Cascade %s could not be loaded from %s" % (resolved, self.paths[resolved])
+                print('haar cascade could not be loaded: %s' % self.paths[resolved])
+                return None, "Server error, service not available"
+            self.errors.pop(resolved, None)
+            self.load_seconds[resolved] = elapsed
+            self.load_count[resolved] = self.load_count.get(resolved, 0) + 1
+        classifiers[resolved] = classifier
+        return classifier, None
+
+    def status(self):
+        """
+        Returns state of registry
+
+        :rtype: dict
+        :return: for every cascade its path, number of threads that loaded it, last load time in seconds and load error
+        """
+
+        with self.lock:
+            return {name: {
+                'path': path,
+                'loaded': self.load_count.get(name, 0),
+                'load_seconds': self.load_seconds.get(name),
+                'error': self.errors.get(name),
+            } for name, path in sorted(self.paths.items())}
@@ -0,0 +1,146 @@
+import io
+import os
+import mmap
+import numpy as np
+from cv2 import cv2
+from PIL import Image
+
+# Pillow is used only to read image headers, its decompression bomb check would make headers of the biggest images unreadable.
+# Number of pixels is limited by check_pixels instead
+Image.MAX_IMAGE_PIXELS = None
+
+# maximum dimension of images processed in preview mode
+PREVIEW_MAX_DIM = int(os.environ.get('PREVIEW_MAX_DIM', 1024))
+
+# uploads smaller than this are read into memory, bigger ones are memory mapped from the file they were spooled to
+MMAP_MIN_BYTES = int(os.environ.get('MMAP_MIN_BYTES', 1024 * 1024))
+
+# JPEG reduction factor -> imdecode flag decoding image directly at reduced size
+JPEG_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+]
+
+
+def read_upload(stream):
+    """
+    Returns content of uploaded file without copying it. Werkzeug keeps small uploads in memory and spools big ones
+    to a temporary file - big files are memory mapped (the mapping stays valid after the file is closed at the end of request),
+    small ones are read into bytes
+
+    :type stream: file
+    :param stream: stream of uploaded file (FileStorage.stream)
+
+    :rtype: bytes or mmap.mmap
+    :return: read-only buffer with content of the file
+    """
+
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size < max(MMAP_MIN_BYTES, 1):
+        return stream.read()
+    try:
+        stream.flush()
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return stream.read()
+
+
+def read_header(file):
+    """
+    Reads size and format of an image without decoding it
+
+    :type file: bytes or mmap.mmap
+    :param file: encoded image
+
+    :rtype: (int, int), string
+    :return: (width, height) and format name (for example 'JPEG'). None, None if header can not be read
+    """
+
+    try:
+        if isinstance(file, mmap.mmap):
+            file.seek(0)
+            fp = file
+        else:
+            fp = io.BytesIO(file)
+        with Image.open(fp) as img:
+            return img.size, img.format
+    except Exception:
+        return None, None
+
+
+def check_pixels(file, max_pixels : int):
+    """
+    Checks number of pixels of an image from its header, before the image is decoded
+
+    :type file: bytes or mmap.mmap
+    :param file: encoded image
+
+    :type max_pixels: int
+    :param max_pixels: maximum number of pixels, 0 disables the check
+
+    :rtype: string, bool
+    :return: error (None if image passes) and whether image was rejected for its size. Images whose header can not be read are rejected,
+        as their size is unknown
+    """
+
+    if not max_pixels:
+        return None, False
+    size, _ = read_header(file)
+    if size is None:
+        return "Image could not be decoded", False
+    if size[0] * size[1] > max_pixels:
+        return "Image has %d x %d pixels, at most %d pixels are allowed" % (size[0], size[1], max_pixels), True
+    return None, False
+
+
+def decode_image(file, max_dim : int = None, grayscale : bool = False, auto_orient : bool = True):
+    """
+    Decodes image, optionally downscaling it so its bigger dimension is not greater than max_dim.
+    JPEG images are decoded directly at reduced size (1/2, 1/4 or 1/8), other formats are resized after decoding.
+
+    :type file: bytes or mmap.mmap
+    :param file: encoded image
+
+    :type max_dim: int
+    :param max_dim: maximum dimension of decoded image, None decodes image at full size
+
+    :type grayscale: bool
+    :param grayscale: whether image should be decoded directly to single channel grayscale image
+
+    :type auto_orient: bool
+    :param auto_orient: whether image should be rotated according to its EXIF orientation tag
+
+    :rtype: CV_8U, float
+    :return: BGR or grayscale image (None if it can not be decoded) and scale of decoded image relative to the original
+    """
+
+    if not file:
+        return None, 1.0
+    npimg = np.frombuffer(file, np.uint8)
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    orientation = 0 if auto_orient else cv2.IMREAD_IGNORE_ORIENTATION
+    flags |= orientation
+    if not max_dim:
+        return cv2.imdecode(npimg, flags=flags), 1.0
+
+    size, fmt = read_header(file)
+    if size and fmt == 'JPEG':
+        for reduction, color_flags, gray_flags in JPEG_REDUCED_FLAGS:
+            if max(size) // reduction >= max_dim:
+                flags = (gray_flags if grayscale else color_flags) | orientation
+                break
+
+    img = cv2.imdecode(npimg, flags=flags)
+    if img is None:
+        return None, 1.0
+    original = max(size) if size else max(img.shape[:2])
+    current = max(img.shape[:2])
+    if current > max_dim:
+        scale = max_dim / current
+        img = cv2.resize(img, (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    return img, max(img.shape[:2]) / original
@@ -0,0 +1,122 @@
+from cv2 import cv2
+import registry
+
+# format name -> (file extension, mimetype, imencode flag of quality parameter, name of quality parameter, default value)
+FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY, 'quality', 75),
+    'png': ('.png', 'image/png', cv2.IMWRITE_PNG_COMPRESSION, 'compression', 3),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY, 'quality', 75),
+}
+
+# quality parameter name -> allowed range
+QUALITY_RANGES = {
+    'quality': (1, 100),
+    'compression': (0, 9),
+}
+
+DEFAULT_FORMAT = 'jpeg'
+
+# ImageProcessor method name -> default output format. Binary masks are smaller and exact in PNG
+METHOD_FORMATS = {method_name: 'png' for method_name, output in registry.OUTPUTS.items() if output == registry.OUTPUT_MASK}
+
+
+def default_format(method_name : str):
+    """
+    Returns default output format of method
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method
+
+    :rtype: string
+    :return: Format name
+    """
+
+    return METHOD_FORMATS.get(method_name, DEFAULT_FORMAT)
+
+
+def parse_output(fmt : str, quality : str = None, compression : str = None):
+    """
+    Parses and validates output format options
+
+    :type fmt: string
+    :param fmt: Format name (jpeg, png or webp), None for default format of the method
+
+    :type quality: string
+    :param quality: Quality of jpeg and webp images (1 - 100)
+
+    :type compression: string
+    :param compression: Compression level of png images (0 - 9)
+
+    :rtype: (string, int, int), string
+    :return: (format name, quality, compression level) and None. Values not provided are None.
+        If options are not correct returns None and error
+    """
+
+    if fmt:
+        fmt = fmt.lower().replace('jpg', 'jpeg')
+        if fmt not in FORMATS:
+            return None, "format should be one of: %s" % ", ".join(FORMATS)
+    else:
+        fmt = None
+    values = []
+    for name, value in (('quality', quality), ('compression', compression)):
+        if value in (None, ''):
+            values.append(None)
+            continue
+        try:
+            value = int(value)
+        except ValueError:
+            return None, "%s should be an integer" % name
+        low, high = QUALITY_RANGES[name]
+        if value < low or value > high:
+            return None, "%s should be between %d and %d" % (name, low, high)
+        values.append(value)
+    return (fmt, values[0], values[1]), None
+
+
+def encode_image(image, fmt : str = DEFAULT_FORMAT, quality : int = None, compression : int = None):
+    """
+    Encodes BGR or single channel image directly with OpenCV
+
+    :type image: CV_8U
+    :param image: Image to encode
+
+    :type fmt: string
+    :param fmt: Format name
+
+    :type quality: int
+    :param quality: Quality of jpeg and webp images. None for format default
+
+    :type compression: int
+    :param compression: Compression level of png images. None for format default
+
+    :rtype: bytes, string, string
+    :return: Encoded image, its mimetype and None. If image can not be encoded returns None, None and error
+    """
+
+    extension, mimetype, flag, name, default = FORMATS[fmt]
+    value = quality if name == 'quality' else compression
+    ok, buffer = cv2.imencode(extension, image, [flag, default if value is None else value])
+    if not ok:
+        return None, None, "Image could not be encoded as %s" % fmt
+    return buffer.tobytes(), mimetype, None
+
+
+def encode_images(images, fmt : str = DEFAULT_FORMAT, quality : int = None, compression : int = None):
+    """
+    Encodes list of images (for example results of a sweep) with the same options, see encode_image
+
+    :type images: [CV_8U]
+    :param images: Images to encode
+
+    :rtype: [bytes], string, string
+    :return: Encoded images, their mimetype and None. If any image can not be encoded returns None, None and error
+    """
+
+    encoded = []
+    for image in images:
+        data, mimetype, error = encode_image(image, fmt, quality, compression)
+        if error:
+            return None, None, error
+        encoded.append(data)
+    return encoded, FORMATS[fmt][1], None
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+# Gunicorn configuration: gunicorn --config gunicorn.conf.py app:app
+#
+# Workers and OpenCV threads are sized so that workers * OpenCV threads is about the number of cores available to the container.
+# Every setting can be overridden with environment variables:
+#   GUNICORN_CPUS     - number of cores to size for (default: cores available to the process, respecting cgroup cpu quota)
+#   GUNICORN_WORKERS  - number of worker processes (default: cores / OPENCV_THREADS, WEB_CONCURRENCY is honoured as well)
+#   OPENCV_THREADS    - size of OpenCV thread pool of every worker (default: cores / workers if workers are given, otherwise min(4, cores))
+#   GUNICORN_THREADS  - request threads of every worker (default OPENCV_THREADS + 1: one per core of the worker, as many methods
+#                       run single threaded in OpenCV, and one more so uploads and encoding overlap with processing)
+#   GUNICORN_TIMEOUT  - worker timeout in seconds (default 120, big images take longer than gunicorn default 30)
+#   GUNICORN_BIND     - address to listen on (default 0.0.0.0:5000)
+#   GUNICORN_PRELOAD  - set to 0 to import the app separately in every worker
+
+
+def available_cpus():
+    """
+    Returns number of cores the process may use - cpu affinity limited by cgroup cpu quota (docker --cpus)
+
+    :rtype: int
+    :return: number of cores
+    """
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()[:2]
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+
+cpus = int(os.environ.get('GUNICORN_CPUS') or available_cpus())
+requested_workers = os.environ.get('GUNICORN_WORKERS') or os.environ.get('WEB_CONCURRENCY')
+if os.environ.get('OPENCV_THREADS'):
+    opencv_threads = int(os.environ['OPENCV_THREADS'])
+elif requested_workers:
+    opencv_threads = max(1, cpus // int(requested_workers))
+else:
+    opencv_threads = min(4, cpus)
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(requested_workers) if requested_workers else max(1, cpus // opencv_threads)
+threads = int(os.environ.get('GUNICORN_THREADS') or opencv_threads + 1)
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# app, OpenCV, numpy and cascade registry are imported once in master and shared with workers copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+# Thread pools and process pool (see processes.py, its processes use PROCESS_OPENCV_THREADS, default 1) of the app would otherwise
+# be sized by all cores in every worker. Environment is read when the app is imported, which happens after this file is loaded
+for variable in ('TILE_WORKERS', 'BATCH_WORKERS', 'PROCESS_WORKERS'):
+    os.environ.setdefault(variable, str(opencv_threads))
+
+# metrics of all workers are aggregated through files in this directory, see metrics.py
+if workers > 1 and not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='imgproc-metrics-')
+
+# asynchronous jobs are stored in this directory, so they can be polled and cancelled through any worker, see jobs.py
+if workers > 1 and not os.environ.get('JOB_DIR'):
+    os.environ['JOB_DIR'] = tempfile.mkdtemp(prefix='imgproc-jobs-')
+
+
+def post_fork(server, worker):
+    from cv2 import cv2
+    cv2.setNumThreads(opencv_threads)
+    server.log.info('Worker %s uses %d OpenCV threads', worker.pid, opencv_threads)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    server.log.info('%d cores: %d workers x %d threads, %d OpenCV threads per worker', cpus, workers, threads, opencv_threads)
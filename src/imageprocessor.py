@@ -1,24 +1,69 @@
 from cv2 import cv2
+import functools
+import math
 import numpy as np
-
+import cascades
+
+# images bigger than this are downscaled before face detection
+DETECTION_MAX_DIM = 1024
+
+DEFAULT_CASCADE = 'frontal'
+
+# smaller gaussian kernels are always computed exactly, approximation would not be faster
+FAST_BLUR_MIN_KSIZE = 15
+
+# number of box filters approximating gaussian kernel in fast mode
+FAST_BLUR_PASSES = 3
+
+# automatic global threshold modes -> cv2.threshold flag computing the threshold from histogram
+THRESHOLD_AUTO_MODES = {
+    'otsu': cv2.THRESH_OTSU,
+    'triangle': cv2.THRESH_TRIANGLE,
+}
+
+# maximum number of parameter sets of a single sweep
+SWEEP_MAX_SIZE = 64
+
+# contact sheets are downscaled so their bigger dimension does not exceed this
+CONTACT_SHEET_MAX_DIM = 4096
+CONTACT_SHEET_GAP = 8
+
+# colour spaces of input images, methods needing COLOR_GRAY convert image to grayscale before processing,
+# so it can be decoded directly to single channel image (see registry.INPUT_COLOR_SPACES)
+COLOR_BGR = 'bgr'
+COLOR_GRAY = 'gray'
+
+# engines of bilateral_filter. 'auto' uses exact bilateral filter up to BILATERAL_EXACT_MAX_D and guided filter for bigger diameters
+BILATERAL_ENGINES = ('auto', 'bilateral', 'guided')
+BILATERAL_EXACT_MAX_D = 15
+
+# angle -> cv2.rotate code of lossless right angle rotation
+RIGHT_ANGLES_COUNTERCLOCKWISE = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+RIGHT_ANGLES_CLOCKWISE = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
     
 class ImageProcessor:
     """
     Class containing methods used for image manipulation
     """
 
-    def __init__(self):
+    def __init__(self, cascade_directories = None):
         """
-        Tries to load haar cascade from file and sets flag if succeeds
+        Creates registry of haar cascades found in FaceDetectionAssets (and cascades bundled with OpenCV).
+        Cascades are loaded lazily, separately for every thread, when they are used for the first time
+
+        :type cascade_directories: [string]
+        :param cascade_directories: Directories searched for cascades, see cascades.CascadeRegistry
         """
 
-        self.haar_cascade = None
-        self.haar_cascade_loaded = False
-        try:
-            self.haar_cascade = cv2.CascadeClassifier('./FaceDetectionAssets/haarcascade_frontalface_default.xml')
-            self.haar_cascade_loaded = True
-        except:
-            print('haar cascade could not be loaded')
+        self.cascades = cascades.CascadeRegistry(cascade_directories)
 
     def read_image(self, filename : str):
         """
@@ -41,9 +86,11 @@ class ImageProcessor:
         :param image: Image to convert
 
         :rtype: CV_U8, None
-        :return: Converted image
+        :return: Converted image. Single channel images are returned unchanged
         """
 
+        if image.ndim == 2:
+            return image, None
         return cv2.cvtColor(image,cv2.COLOR_BGR2RGB), None
 
     def write_image(self, image, filename: str):
@@ -67,12 +114,26 @@ class ImageProcessor:
         :param image: Image to convert
 
         :rtype: CV_U8, None
-        :return: Converted image to grayscale
+        :return: Converted image to grayscale. Single channel images are returned unchanged
         """
 
+        if image.ndim == 2:
+            return image, None
         result = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         return result, None
 
+    def validate_median_blur(self, ksize : int):
+        """
+        Validates parameters of median_blur
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if ksize < 1 or ksize%2 == 0:
+            return "Kernel size should be positive odd number"
+        return None
+
     def median_blur(self, image, ksize : int):
         """
         Applies median blur to an image
@@ -87,12 +148,25 @@ class ImageProcessor:
         :return: Returns blured image and None. If ksize is not correct returns original image and error
         """
 
-        if ksize < 1 or ksize%2 == 0:
-            return image, "Kernel size should be positive odd number"
+        error = self.validate_median_blur(ksize)
+        if error:
+            return image, error
         result = cv2.medianBlur(image, ksize=ksize)
         return result, None
 
-    def gaussian_blur(self, image, ksize_x : int, ksize_y : int):
+    def validate_gaussian_blur(self, ksize_x : int, ksize_y : int, fast : bool = False):
+        """
+        Validates parameters of gaussian_blur
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if ksize_x < 1 or ksize_y < 1 or ksize_x%2 == 0 or ksize_y%2 == 0:
+            return "Kernel sizes should be positive odd numbers"
+        return None
+
+    def gaussian_blur(self, image, ksize_x : int, ksize_y : int, fast : bool = False):
         """
         Applies gaussian blur to an image
 
@@ -105,15 +179,36 @@ class ImageProcessor:
         :type ksize_y: int
         :param ksize_y: Y size of kernel. Must be positive odd number
 
+        :type fast: bool
+        :param fast: Approximates kernels of size FAST_BLUR_MIN_KSIZE and bigger with FAST_BLUR_PASSES box filters, so time per pixel
+            does not depend on kernel size. Result differs from the exact one by at most 15 grey levels
+            (usually no more than 4 on photographs, with mean difference below 0.5)
+
         :rtype: CV_U8, string
         :return: Returns blured image and None. If either of ksizes is not correct returns original image and error
         """
 
-        if ksize_x < 1 or ksize_y < 1 or ksize_x%2 == 0 or ksize_y%2 == 0:
-            return image, "Kernel sizes should be positive odd numbers"
+        error = self.validate_gaussian_blur(ksize_x, ksize_y, fast)
+        if error:
+            return image, error
+        if fast and max(ksize_x, ksize_y) >= FAST_BLUR_MIN_KSIZE:
+            result = image
+            for box_x, box_y in zip(box_blur_sizes(ksize_x), box_blur_sizes(ksize_y)):
+                result = cv2.blur(result, (box_x, box_y))
+            return result, None
         result = cv2.GaussianBlur(image, (ksize_x, ksize_y), 0)
         return result, None
 
+    def validate_average_blur(self, ksize_x : int, ksize_y : int):
+        """
+        Validates parameters of average_blur
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        return self.validate_gaussian_blur(ksize_x, ksize_y)
+
     def average_blur(self, image, ksize_x : int, ksize_y : int):
         """
         Applies averaging blur to an image
@@ -131,14 +226,31 @@ class ImageProcessor:
         :return: Returns blured image and None. If either of ksizes is not correct returns original image and error
         """
 
-        if ksize_x < 1 or ksize_y < 1 or ksize_x%2 == 0 or ksize_y%2 == 0:
-            return image, "Kernel sizes should be positive odd numbers"
+        error = self.validate_average_blur(ksize_x, ksize_y)
+        if error:
+            return image, error
         result = cv2.blur(image, (ksize_x, ksize_y))
         return result, None
 
-    def bilateral_filter(self, image, d : int, sigma : float):
+    def validate_bilateral_filter(self, d : int, sigma : float, engine : str = 'auto'):
         """
-        Applies gaussian blur to an image
+        Validates parameters of bilateral_filter
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if d < 1:
+            return "d should be positive"
+        if sigma <= 0:
+            return "Sigma should be positive"
+        if engine not in BILATERAL_ENGINES:
+            return "Engine should be one of: %s" % ", ".join(BILATERAL_ENGINES)
+        return None
+
+    def bilateral_filter(self, image, d : int, sigma : float, engine : str = 'auto'):
+        """
+        Applies edge preserving smoothing to an image
 
         :type image: CV_8U
         :param image: Image to blur
@@ -149,18 +261,42 @@ class ImageProcessor:
         :type sigma: int
         :param sigma: Filter sigma in the color space. Must be positive number.
 
-        :rtype: CV_U8, string
-        :return: Returns filtered image and None. If either of params is not correct returns original image and error
+        :type engine: string
+        :param engine: 'bilateral' - exact bilateral filter, its cost grows with d squared. 'guided' - guided filter
+            (image is its own guide, sigma squared is its regularization), its cost does not depend on d. 'auto' chooses guided filter for d bigger than BILATERAL_EXACT_MAX_D
+
+        :rtype: CV_U8, string, dict
+        :return: Returns filtered image, None and name of engine that was used ({'engine': name}). If either of params is not correct returns original image and error
         """
 
-        if d < 1:
-            return image, "d should be positive"
-        if sigma <= 0:
-            return image, "Sigma should be positive"
-        result = cv2.bilateralFilter(image, d, sigma, sigma)
-        return result, None
+        error = self.validate_bilateral_filter(d, sigma, engine)
+        if error:
+            return image, error, None
+        engine = bilateral_engine(d, engine)
+        if engine == 'guided':
+            result = guided_filter(image, d // 2, sigma)
+        else:
+            result = cv2.bilateralFilter(image, d, sigma, sigma)
+        return result, None, {'engine': engine}
+
+    def validate_global_threshold(self, threshold : int, value : int, auto : str = ''):
+        """
+        Validates parameters of global_threshold
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if auto:
+            if auto not in THRESHOLD_AUTO_MODES:
+                return "Automatic threshold should be one of: %s" % ", ".join(THRESHOLD_AUTO_MODES)
+        elif threshold <= 0 or threshold > 255:
+            return "Threshold should be between 0 and 255"
+        if value <= 0 or value > 255:
+            return "Value should be between 0 and 255"
+        return None
 
-    def global_threshold(self, image, threshold : int, value : int):
+    def global_threshold(self, image, threshold : int, value : int, auto : str = ''):
         """
         Applies global thresholding to an image
 
@@ -173,17 +309,85 @@ class ImageProcessor:
         :type value: int
         :param value: Value that pixels with values above threshold will get after thresholding. 0 < Value <= 255
 
-        :rtype: CV_U8, string
-        :return: Returns thresholded image and None. If either of params is not correct returns original image and error
+        :type auto: string
+        :param auto: 'otsu' or 'triangle' replaces threshold with automatic threshold computed from histogram of an image
+
+        :rtype: CV_U8, string, dict
+        :return: Returns thresholded image, None and used threshold along with automatic thresholds ({'threshold', 'otsu', 'triangle'}).
+            If either of params is not correct returns original image and error
         """
 
-        if threshold <= 0 or threshold > 255:
-            return image, "Threshold should be between 0 and 255"
-        if value <= 0 or value > 255:
-            return image, "Value should be between 0 and 255"
+        error = self.validate_global_threshold(threshold, value, auto)
+        if error:
+            return image, error, None
         result, _ = self.to_grayscale(image)
+        automatic = automatic_thresholds(result)
+        if auto:
+            threshold = automatic[auto]
         _, result = cv2.threshold(result, threshold, value, cv2.THRESH_BINARY)
-        return result, None
+        return result, None, dict(automatic, threshold=threshold)
+
+    def validate_global_threshold_sweep(self, thresholds : list, value : int, sheet : bool = False):
+        """
+        Validates parameters of global_threshold_sweep
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        error = validate_sweep(thresholds)
+        if error:
+            return error
+        for threshold in thresholds:
+            error = self.validate_global_threshold(threshold, value)
+            if error:
+                return "Threshold %s: %s" % (threshold, error)
+        return None
+
+    def global_threshold_sweep(self, image, thresholds : list, value : int, sheet : bool = False):
+        """
+        Applies global thresholding with many thresholds. Image is converted to grayscale once and every threshold is applied with a lookup table
+
+        :type image: CV_8U
+        :param image: Image to threshold
+
+        :type thresholds: [int]
+        :param thresholds: Thresholds, see global_threshold. At most SWEEP_MAX_SIZE
+
+        :type value: int
+        :param value: Value that pixels with values above threshold will get after thresholding. 0 < Value <= 255
+
+        :type sheet: bool
+        :param sheet: Whether results should be combined into a single labelled contact sheet
+
+        :rtype: [CV_U8], string, dict
+        :return: Returns thresholded images (or contact sheet), None and thresholds along with automatic thresholds ({'thresholds', 'otsu', 'triangle'}).
+            If either of params is not correct returns original image and error
+        """
+
+        error = self.validate_global_threshold_sweep(thresholds, value, sheet)
+        if error:
+            return image, error, None
+        gray, _ = self.to_grayscale(image)
+        levels = np.arange(256)
+        results = [cv2.LUT(gray, np.where(levels > threshold, value, 0).astype(np.uint8)) for threshold in thresholds]
+        if sheet:
+            results = contact_sheet(results, [str(threshold) for threshold in thresholds])
+        return results, None, dict(automatic_thresholds(gray), thresholds=thresholds)
+
+    def validate_mean_threshold(self, blocksize : int, c : float, value : int):
+        """
+        Validates parameters of mean_threshold
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if blocksize < 1 or blocksize%2 == 0:
+            return "Blocksize should be positive odd number"
+        if value <= 0 or value > 255:
+            return "Value should be between 0 and 255"
+        return None
 
     def mean_threshold(self, image, blocksize : int, c : float, value : int):
         """
@@ -205,14 +409,23 @@ class ImageProcessor:
         :return: Returns thresholded image and None. If either of params is not correct returns original image and error
         """
 
-        if blocksize < 1 or blocksize%2 == 0:
-            return image, "Blocksize should be positive odd number"
-        if value <= 0 or value > 255:
-            return image, "Value should be between 0 and 255"
+        error = self.validate_mean_threshold(blocksize, c, value)
+        if error:
+            return image, error
         result, _ = self.to_grayscale(image)
         result = cv2.adaptiveThreshold(result, value, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, blocksize, c)
         return result, None
         
+    def validate_gaussian_threshold(self, blocksize : int, c : float, value : int):
+        """
+        Validates parameters of gaussian_threshold
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        return self.validate_mean_threshold(blocksize, c, value)
+
     def gaussian_threshold(self, image, blocksize : int, c : float, value : int):
         """
         Applies gaussian thresholding to an image
@@ -233,14 +446,118 @@ class ImageProcessor:
         :return: Returns thresholded image and None. If either of params is not correct returns original image and error
         """
 
-        if blocksize < 1 or blocksize%2 == 0:
-            return image, "Blocksize should be positive odd number"
-        if value <= 0 or value > 255:
-            return image, "Value should be between 0 and 255"
+        error = self.validate_gaussian_threshold(blocksize, c, value)
+        if error:
+            return image, error
         result, _ = self.to_grayscale(image)
         result = cv2.adaptiveThreshold(result, value, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, blocksize, c)
         return result, None
 
+    def validate_mean_threshold_sweep(self, params : list, value : int, sheet : bool = False):
+        """
+        Validates parameters of mean_threshold_sweep
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        error = validate_sweep(params)
+        if error:
+            return error
+        for blocksize, c in params:
+            error = self.validate_mean_threshold(blocksize, c, value)
+            if error:
+                return "Blocksize %s, c %s: %s" % (blocksize, c, error)
+        return None
+
+    def mean_threshold_sweep(self, image, params : list, value : int, sheet : bool = False):
+        """
+        Applies mean thresholding with many blocksize and c pairs. Image is converted to grayscale once
+        and mean of the neighbourhood is computed once for every blocksize
+
+        :type image: CV_8U
+        :param image: Image to threshold
+
+        :type params: [(int, float)]
+        :param params: (blocksize, c) pairs, see mean_threshold. At most SWEEP_MAX_SIZE
+
+        :type value: int
+        :param value: Value that pixels with values above threshold will get after thresholding. 0 < Value <= 255
+
+        :type sheet: bool
+        :param sheet: Whether results should be combined into a single labelled contact sheet
+
+        :rtype: [CV_U8], string, dict
+        :return: Returns thresholded images (or contact sheet), None and pairs ({'params'}). If either of params is not correct returns original image and error
+        """
+
+        error = self.validate_mean_threshold_sweep(params, value, sheet)
+        if error:
+            return image, error, None
+        gray, _ = self.to_grayscale(image)
+        results = adaptive_threshold_sweep(gray, params, value, lambda blocksize: cv2.boxFilter(gray, -1, (blocksize, blocksize), borderType=ADAPTIVE_BORDER))
+        if sheet:
+            results = contact_sheet(results, ["%d, %g" % (blocksize, c) for blocksize, c in params])
+        return results, None, {'params': params}
+
+    def validate_gaussian_threshold_sweep(self, params : list, value : int, sheet : bool = False):
+        """
+        Validates parameters of gaussian_threshold_sweep
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        return self.validate_mean_threshold_sweep(params, value, sheet)
+
+    def gaussian_threshold_sweep(self, image, params : list, value : int, sheet : bool = False):
+        """
+        Applies gaussian thresholding with many blocksize and c pairs. Image is converted to grayscale once
+        and gaussian weighted mean of the neighbourhood is computed once for every blocksize
+
+        :type image: CV_8U
+        :param image: Image to threshold
+
+        :type params: [(int, float)]
+        :param params: (blocksize, c) pairs, see gaussian_threshold. At most SWEEP_MAX_SIZE
+
+        :type value: int
+        :param value: Value that pixels with values above threshold will get after thresholding. 0 < Value <= 255
+
+        :type sheet: bool
+        :param sheet: Whether results should be combined into a single labelled contact sheet
+
+        :rtype: [CV_U8], string, dict
+        :return: Returns thresholded images (or contact sheet), None and pairs ({'params'}). If either of params is not correct returns original image and error
+        """
+
+        error = self.validate_gaussian_threshold_sweep(params, value, sheet)
+        if error:
+            return image, error, None
+        gray, _ = self.to_grayscale(image)
+        floating = gray.astype(np.float32)
+        results = adaptive_threshold_sweep(gray, params, value,
+            lambda blocksize: cv2.convertScaleAbs(cv2.GaussianBlur(floating, (blocksize, blocksize), 0, borderType=ADAPTIVE_BORDER)))
+        if sheet:
+            results = contact_sheet(results, ["%d, %g" % (blocksize, c) for blocksize, c in params])
+        return results, None, {'params': params}
+
+    def validate_sobel(self, dx : int, dy : int, ksize : int, delta : float):
+        """
+        Validates parameters of sobel
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if not (dx == 1 or dx == 0) or not (dy == 1 or dy == 0):
+            return "dx and dy should be 1 or 0"
+        if dx + dy == 0:
+            return "dx or dy should be 1"
+        if ksize < 1 or ksize%2 == 0:
+            return "Kernel size should be positive odd number"
+        return None
+
     def sobel(self, image, dx : int, dy : int, ksize : int, delta : float):
         """
         Applies sobel gradient to an image
@@ -264,16 +581,26 @@ class ImageProcessor:
         :return: Returns an image with aplied sobel gradient and None. If either of params is not correct returns original image and error
         """
 
-        if not (dx == 1 or dx == 0) or not (dy == 1 or dy == 0):
-            return image, "dx and dy should be 1 or 0"
-        if ksize < 1 or ksize%2 == 0:
-            return image, "Kernel size should be positive odd number"
+        error = self.validate_sobel(dx, dy, ksize, delta)
+        if error:
+            return image, error
         result, _ = self.to_grayscale(image)
-        result = cv2.Sobel(result, cv2.CV_64F, dx, dy, ksize=ksize, delta=delta)
-        result = np.absolute(result)
-        result = np.uint8(result)
+        result = cv2.Sobel(result, cv2.CV_16S, dx, dy, ksize=ksize, delta=delta)
+        result = cv2.convertScaleAbs(result)
         return result, None
 
+    def validate_laplacian(self, ksize : int, delta : float):
+        """
+        Validates parameters of laplacian
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if ksize < 1 or ksize % 2 == 0:
+            return "Kernel size should be positive odd number"
+        return None
+
     def laplacian(self, image, ksize : int, delta : float):
         """
         Applies laplacian gradient to an image
@@ -291,15 +618,72 @@ class ImageProcessor:
         :return: Returns an image with aplied sobel gradient and None. If either of params is not correct returns original image and error
         """
 
-        if ksize < 1 or ksize % 2 == 0:
-            return image, "Kernel size should be positive odd number"
+        error = self.validate_laplacian(ksize, delta)
+        if error:
+            return image, error
         result, _ = self.to_grayscale(image)
-        result = cv2.Laplacian(result, cv2.CV_64F, ksize=ksize, delta=delta)
-        result = np.absolute(result)
-        result = np.uint8(result)
+        result = cv2.Laplacian(result, cv2.CV_16S, ksize=ksize, delta=delta)
+        result = cv2.convertScaleAbs(result)
         return result, None
 
-    def canny_edge_detection(self, image, threshold1 : int, threshold2 : int):
+    def validate_gradient(self, ksize : int, orientation : int = 0):
+        """
+        Validates parameters of gradient
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if ksize < 1 or ksize % 2 == 0 or ksize > 31:
+            return "Kernel size should be positive odd number not greater than 31"
+        if orientation not in (0, 1):
+            return "orientation should be 1 or 0"
+        return None
+
+    def gradient(self, image, ksize : int, orientation : int = 0):
+        """
+        Computes magnitude and orientation of sobel gradient, both derivatives are computed in a single call
+
+        :type image: CV_8U
+        :param image: Image to process
+
+        :type ksize: int
+        :param ksize: Size of kernel. Must be a positive odd number not greater than 31
+
+        :type orientation: int
+        :param orientation: 0 returns magnitude of the gradient, 1 returns color image with orientation of the gradient as hue and its magnitude as brightness
+
+        :rtype: CV_U8, string
+        :return: Returns gradient image (magnitude saturated to 255) and None. If either of params is not correct returns original image and error
+        """
+
+        error = self.validate_gradient(ksize, orientation)
+        if error:
+            return image, error
+        gray, _ = self.to_grayscale(image)
+        magnitude, angle = cv2.cartToPolar(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=ksize), cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=ksize), angleInDegrees=True)
+        magnitude = cv2.convertScaleAbs(magnitude)
+        if not orientation:
+            return magnitude, None
+        hue = cv2.convertScaleAbs(angle, alpha=0.5)
+        hsv = cv2.merge([hue, np.full_like(hue, 255), magnitude])
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR), None
+
+    def validate_canny_edge_detection(self, threshold1 : int, threshold2 : int, blur : int = 0, l2 : bool = False):
+        """
+        Validates parameters of canny_edge_detection
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if threshold1 <= 0 or threshold1 > 255 or threshold2 <= 0 or threshold2 > 255:
+            return "Thresholds should be between 0 and 255"
+        if blur < 0 or (blur and blur % 2 == 0):
+            return "Blur should be 0 or positive odd number"
+        return None
+
+    def canny_edge_detection(self, image, threshold1 : int, threshold2 : int, blur : int = 0, l2 : bool = False):
         """
         Applies canny edge detector to an image
 
@@ -312,17 +696,162 @@ class ImageProcessor:
         :type threshold2: int
         :param delta: First threshold for canny edge detection. 0 < threshold2 <= 255
 
+        :type blur: int
+        :param blur: Size of gaussian kernel the image is blurred with before detection, 0 disables blurring
+
+        :type l2: bool
+        :param l2: Whether magnitude of the gradient should be computed with L2 norm instead of L1
+
         :rtype: CV_U8, string
         :return: Returns an image containing edges detected by canny edge detection algorithm and None. If either of params is not correct returns original image and error
         """
 
-        if threshold1 <= 0 or threshold1 > 255 or threshold2 <= 0 or threshold2 > 255:
-            return image, "Thresholds should be between 0 and 255"
+        error = self.validate_canny_edge_detection(threshold1, threshold2, blur, l2)
+        if error:
+            return image, error
         result, _ = self.to_grayscale(image)
-        result = cv2.Canny(result, threshold1, threshold2)
+        if blur:
+            result = cv2.GaussianBlur(result, (blur, blur), 0)
+        result = cv2.Canny(result, threshold1, threshold2, L2gradient=bool(l2))
         return result, None
 
-    def haar_frontal_face_detection(self, image, min_neighbours : int, scale : float):
+    def validate_canny_sweep(self, thresholds : list, blur : int = 0, l2 : bool = False, sheet : bool = False):
+        """
+        Validates parameters of canny_sweep
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        error = validate_sweep(thresholds)
+        if error:
+            return error
+        for threshold1, threshold2 in thresholds:
+            error = self.validate_canny_edge_detection(threshold1, threshold2, blur, l2)
+            if error:
+                return "Thresholds %s, %s: %s" % (threshold1, threshold2, error)
+        return None
+
+    def canny_sweep(self, image, thresholds : list, blur : int = 0, l2 : bool = False, sheet : bool = False):
+        """
+        Applies canny edge detector with many threshold pairs. Grayscale conversion, blur and sobel derivatives are computed once,
+        only hysteresis is run for every pair
+
+        :type image: CV_8U
+        :param image: Image to process
+
+        :type thresholds: [(int, int)]
+        :param thresholds: (threshold1, threshold2) pairs, see canny_edge_detection. At most SWEEP_MAX_SIZE
+
+        :type blur: int
+        :param blur: Size of gaussian kernel the image is blurred with before detection, 0 disables blurring
+
+        :type l2: bool
+        :param l2: Whether magnitude of the gradient should be computed with L2 norm instead of L1
+
+        :type sheet: bool
+        :param sheet: Whether results should be combined into a single labelled contact sheet
+
+        :rtype: [CV_U8], string, dict
+        :return: Returns edge maps (or contact sheet), None and threshold pairs ({'thresholds'}). If either of params is not correct returns original image and error
+        """
+
+        error = self.validate_canny_sweep(thresholds, blur, l2, sheet)
+        if error:
+            return image, error, None
+        gray, _ = self.to_grayscale(image)
+        if blur:
+            gray = cv2.GaussianBlur(gray, (blur, blur), 0)
+        # the same derivatives as computed by cv2.Canny from an image
+        dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        results = [cv2.Canny(dx, dy, threshold1, threshold2, L2gradient=bool(l2)) for threshold1, threshold2 in thresholds]
+        if sheet:
+            results = contact_sheet(results, ["%d, %d" % (threshold1, threshold2) for threshold1, threshold2 in thresholds])
+        return results, None, {'thresholds': thresholds}
+
+    def validate_haar_frontal_face_detection(self, min_neighbours : int, scale : float, min_size : int = 0, max_size : int = 0, max_detection_dim : int = DETECTION_MAX_DIM, cascade : str = DEFAULT_CASCADE):
+        """
+        Validates parameters of haar_frontal_face_detection and checks whether haar cascade is loaded
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        if self.cascades.resolve(cascade) is None:
+            return "Unknown cascade %s, available cascades: %s" % (cascade, ", ".join(self.cascades.names()))
+        if min_neighbours < 1:
+            return "min_neighbours should be positive number"
+        if scale <= 1:
+            return "scale should be greater then 1"
+        if min_size < 0 or max_size < 0:
+            return "min_size and max_size should not be negative"
+        if max_size and max_size < min_size:
+            return "max_size should not be smaller then min_size"
+        if max_detection_dim < 0:
+            return "max_detection_dim should not be negative"
+        return None
+
+    def validate_detect_frontal_faces(self, min_neighbours : int, scale : float, min_size : int = 0, max_size : int = 0, max_detection_dim : int = DETECTION_MAX_DIM, cascade : str = DEFAULT_CASCADE):
+        """
+        Validates parameters of detect_frontal_faces
+
+        :rtype: string
+        :return: Error message or None if parameters are correct
+        """
+
+        return self.validate_haar_frontal_face_detection(min_neighbours, scale, min_size, max_size, max_detection_dim, cascade)
+
+    def detect_frontal_faces(self, image, min_neighbours : int, scale : float, min_size : int = 0, max_size : int = 0, max_detection_dim : int = DETECTION_MAX_DIM, cascade : str = DEFAULT_CASCADE):
+        """
+        Detects human faces within an image without marking them.
+        Images bigger than max_detection_dim are downscaled before detection and coordinates are scaled back.
+
+        :type image: CV_8U
+        :param image: BGR or grayscale image
+
+        :type min_neighbours: int
+        :param min_neighbours: Parameter specifying how many neighbors each candidate rectangle should have to retain it. Must be greater or equal 1
+
+        :type scale: float
+        :param scale: Parameter specifying how much the image size is reduced at each image scale. Must be greater then 1
+
+        :type min_size: int
+        :param min_size: Minimum size of face in pixels of the original image. 0 means no limit
+
+        :type max_size: int
+        :param max_size: Maximum size of face in pixels of the original image. 0 means no limit
+
+        :type max_detection_dim: int
+        :param max_detection_dim: Maximum dimension of image the detection is run on. 0 disables downscaling
+
+        :type cascade: string
+        :param cascade: Name of haar cascade (for example frontal, profile, eyes)
+
+        :rtype: [[int, int, int, int]], string
+        :return: Returns coordinates of detected faces (top left x, top left y, width, height) and None. If either of params is not correct or haar cascade can not be loaded returns None and error
+        """
+
+        error = self.validate_detect_frontal_faces(min_neighbours, scale, min_size, max_size, max_detection_dim, cascade)
+        if error:
+            return None, error
+        classifier, error = self.cascades.get(cascade)
+        if error:
+            return None, error
+        gray, _ = self.to_grayscale(image)
+
+        factor = 1.0
+        if max_detection_dim and max(gray.shape[:2]) > max_detection_dim:
+            factor = max_detection_dim / max(gray.shape[:2])
+            gray = cv2.resize(gray, (max(1, round(gray.shape[1] * factor)), max(1, round(gray.shape[0] * factor))), interpolation=cv2.INTER_AREA)
+        min_size = round(min_size * factor)
+        max_size = round(max_size * factor)
+
+        detected_faces = classifier.detectMultiScale(gray, minNeighbors=min_neighbours, scaleFactor=scale,
+            minSize=(min_size, min_size), maxSize=(max_size, max_size))
+        return [[int(round(v / factor)) for v in face] for face in detected_faces], None
+
+    def haar_frontal_face_detection(self, image, min_neighbours : int, scale : float, min_size : int = 0, max_size : int = 0, max_detection_dim : int = DETECTION_MAX_DIM, cascade : str = DEFAULT_CASCADE):
         """
         Detects human faces within an image and marks them.
 
@@ -335,31 +864,38 @@ class ImageProcessor:
         :type scale: float
         :param scale: Parameter specifying how much the image size is reduced at each image scale. Must be greater then 1
 
-        :rtype: CV_U8, string, [(int, int, int, int)]
+        :type min_size: int
+        :param min_size: Minimum size of face in pixels. 0 means no limit
+
+        :type max_size: int
+        :param max_size: Maximum size of face in pixels. 0 means no limit
+
+        :type max_detection_dim: int
+        :param max_detection_dim: Maximum dimension of image the detection is run on. 0 disables downscaling
+
+        :type cascade: string
+        :param cascade: Name of haar cascade (for example frontal, profile, eyes)
+
+        :rtype: CV_U8, string, [[int, int, int, int]]
         :return: Returns an image with marked faces, None and coordinates of detected faces (top left x, top left y, width, height). If either of params is not correct or haar cascade is not loaded returns original image and error
         """
 
-        if not self.haar_cascade_loaded:
-            return image, "Server error, service not available"
-        if min_neighbours < 1:
-            return image, "min_neighbours should be positive number"
-        if scale <= 1:
-            return image, "scale should be greater then 1"
-        gray, _ = self.to_grayscale(image)
-
-        detected_faces = self.haar_cascade.detectMultiScale(gray, minNeighbors=min_neighbours, scaleFactor=scale)
+        detected_faces, error = self.detect_frontal_faces(image, min_neighbours, scale, min_size, max_size, max_detection_dim, cascade)
+        if error:
+            return image, error
         for (x, y, w, h) in detected_faces:
             cv2.rectangle(image, (x, y), (x + w, y + h), color=(0, 255, 0), thickness=2)
         return image, None, detected_faces
 
-    def naive_rotate(self, image, angle : int):
+    def naive_rotate(self, image, angle : float):
         """
-        Rotates an image without changing size of an image.
+        Rotates an image counterclockwise without changing size of an image.
+        Right angles are done losslessly by transposition and flips.
 
         :type image: CV_8U
         :param image: Image to threshold
 
-        :type angle: int
+        :type angle: float
         :param angle: Angle in degrees
 
         :rtype: CV_U8, None
@@ -368,18 +904,23 @@ class ImageProcessor:
 
         angle = angle % 360
         (h, w) = image.shape[:2]
-        center = (h // 2, w // 2)
-        rotated = cv2.warpAffine(image, cv2.getRotationMatrix2D(center, angle, 1.0), (w, h))
+        if angle == 0:
+            return image, None
+        if angle in RIGHT_ANGLES_COUNTERCLOCKWISE and (angle == 180 or (h - w) % 2 == 0):
+            return fit_to_canvas(cv2.rotate(image, RIGHT_ANGLES_COUNTERCLOCKWISE[angle]), h, w), None
+        M, size = rotation_matrix(h, w, angle, False)
+        rotated = cv2.warpAffine(image, M, size)
         return rotated, None
 
-    def rotate(self, image, angle : int):
+    def rotate(self, image, angle : float):
         """
-        Rotates an image and extends its size if it is necessary.
+        Rotates an image clockwise and extends its size if it is necessary.
+        Right angles are done losslessly by transposition and flips.
 
         :type image: CV_8U
         :param image: Image to threshold
 
-        :type angle: int
+        :type angle: float
         :param angle: Angle in degrees
 
         :rtype: CV_U8, None
@@ -387,11 +928,248 @@ class ImageProcessor:
         """
 
         angle = angle % 360
+        if angle == 0:
+            return image, None
+        if angle in RIGHT_ANGLES_CLOCKWISE:
+            return cv2.rotate(image, RIGHT_ANGLES_CLOCKWISE[angle]), None
         (h, w) = image.shape[:2]
-        center = (w / 2, h / 2)
+        M, size = rotation_matrix(h, w, angle, True)
+        return cv2.warpAffine(image, M, size), None
+
+
+def automatic_thresholds(gray):
+    """
+    Computes automatic global thresholds of grayscale image
+
+    :type gray: CV_8U
+    :param gray: Single channel image
+
+    :rtype: dict
+    :return: threshold for every mode of THRESHOLD_AUTO_MODES
+    """
+
+    return {mode: int(cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | flag)[0]) for mode, flag in THRESHOLD_AUTO_MODES.items()}
+
+
+def validate_sweep(params):
+    """
+    Validates list of parameter sets of a sweep
+
+    :rtype: string
+    :return: Error message or None if list is correct
+    """
+
+    if not isinstance(params, list) or not params:
+        return "Sweep should be a non empty list"
+    if len(params) > SWEEP_MAX_SIZE:
+        return "Sweep should contain at most %d parameter sets" % SWEEP_MAX_SIZE
+    return None
+
+
+# border of neighbourhood used by cv2.adaptiveThreshold
+ADAPTIVE_BORDER = cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED
+
+
+def adaptive_threshold_sweep(gray, params, value : int, neighbourhood):
+    """
+    Applies adaptive thresholding with many blocksize and c pairs, giving the same results as cv2.adaptiveThreshold.
+    Neighbourhood image and its difference from the image are computed once for every blocksize
+
+    :type gray: CV_8U
+    :param gray: Single channel image
+
+    :type params: [(int, float)]
+    :param params: (blocksize, c) pairs
+
+    :type value: int
+    :param value: Value that pixels with values above threshold will get after thresholding
+
+    :type neighbourhood: function
+    :param neighbourhood: function returning mean of neighbourhood (CV_8U) for blocksize
+
+    :rtype: [CV_U8]
+    :return: Thresholded images in order of params
+    """
+
+    differences = {}
+    results = []
+    for blocksize, c in params:
+        if blocksize not in differences:
+            differences[blocksize] = cv2.subtract(gray, neighbourhood(blocksize), dtype=cv2.CV_16S)
+        # cv2.adaptiveThreshold rounds c up for THRESH_BINARY
+        mask = cv2.compare(differences[blocksize], -math.ceil(c), cv2.CMP_GT)
+        results.append(mask if value == 255 else cv2.bitwise_and(mask, value))
+    return results
+
+
+def contact_sheet(images, labels):
+    """
+    Combines images of the same size into a labelled grid
+
+    :type images: [CV_8U]
+    :param images: Images to combine
+
+    :type labels: [string]
+    :param labels: Label drawn in top left corner of every image
+
+    :rtype: CV_8U
+    :return: Contact sheet, downscaled if its bigger dimension would exceed CONTACT_SHEET_MAX_DIM
+    """
+
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    h, w = images[0].shape[:2]
+    gap = CONTACT_SHEET_GAP
+    scale = min(1.0, (CONTACT_SHEET_MAX_DIM - gap * (columns + 1)) / (w * columns), (CONTACT_SHEET_MAX_DIM - gap * (rows + 1)) / (h * rows))
+    cell_w, cell_h = max(1, int(w * scale)), max(1, int(h * scale))
+    sheet = np.full((rows * cell_h + gap * (rows + 1), columns * cell_w + gap * (columns + 1)) + images[0].shape[2:], 128, dtype=np.uint8)
+    for index, (image, label) in enumerate(zip(images, labels)):
+        if scale < 1:
+            image = cv2.resize(image, (cell_w, cell_h), interpolation=cv2.INTER_AREA)
+        row, column = divmod(index, columns)
+        y, x = gap + row * (cell_h + gap), gap + column * (cell_w + gap)
+        sheet[y:y + cell_h, x:x + cell_w] = image
+        cv2.putText(sheet, label, (x + 4, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 3)
+        cv2.putText(sheet, label, (x + 4, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    return sheet
+
+
+def bilateral_engine(d : int, engine : str):
+    """
+    Resolves 'auto' engine of bilateral_filter
+
+    :type d: int
+    :param d: Diameter of pixel neighbourhood
+
+    :type engine: string
+    :param engine: One of BILATERAL_ENGINES
+
+    :rtype: string
+    :return: 'bilateral' or 'guided'
+    """
+
+    if engine == 'auto':
+        return 'guided' if d > BILATERAL_EXACT_MAX_D else 'bilateral'
+    return engine
+
+
+def guided_filter(image, radius : int, sigma : float):
+    """
+    Edge preserving smoothing with self guided filter (He et al.), computed with box filters, so its cost does not depend on radius.
+    For big radii linear coefficients are computed on downscaled image and upscaled (fast guided filter).
+
+    :type image: CV_8U
+    :param image: Image to filter, every channel is filtered separately
+
+    :type radius: int
+    :param radius: Radius of the window
+
+    :type sigma: float
+    :param sigma: Edges with contrast much bigger than sigma (in grey levels) are preserved
+
+    :rtype: CV_U8
+    :return: Filtered image
+    """
+
+    h, w = image.shape[:2]
+    radius = max(radius, 1)
+    step = max(1, radius // 4)
+    guide = image.astype(np.float32)
+    small = cv2.resize(guide, (max(1, round(w / step)), max(1, round(h / step))), interpolation=cv2.INTER_AREA) if step > 1 else guide
+    window = (2 * max(1, round(radius / step)) + 1,) * 2
+
+    mean = cv2.blur(small, window)
+    variance = cv2.subtract(cv2.blur(cv2.multiply(small, small), window), cv2.multiply(mean, mean))
+    # constant is added with numpy, cv2.add with a python scalar would add it to the first channel only
+    a = cv2.divide(variance, variance + sigma * sigma)
+    b = cv2.subtract(mean, cv2.multiply(a, mean))
+    a = cv2.blur(a, window)
+    b = cv2.blur(b, window)
+    if step > 1:
+        a = cv2.resize(a, (w, h), interpolation=cv2.INTER_LINEAR)
+        b = cv2.resize(b, (w, h), interpolation=cv2.INTER_LINEAR)
+    return cv2.convertScaleAbs(cv2.add(cv2.multiply(a, guide), b))
+
+
+@functools.lru_cache(maxsize=256)
+def box_blur_sizes(ksize : int):
+    """
+    Computes sizes of box filters whose repeated application approximates gaussian kernel of given size
+    (the same sigma as cv2.GaussianBlur derives from ksize)
+
+    :type ksize: int
+    :param ksize: Size of gaussian kernel
+
+    :rtype: (int)
+    :return: FAST_BLUR_PASSES odd box sizes
+    """
+
+    sigma = 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+    variance = 12 * sigma * sigma
+    lower = int(math.sqrt(variance / FAST_BLUR_PASSES + 1))
+    lower -= 1 - lower % 2
+    # number of passes using lower size, the rest uses lower + 2 so the total variance is closest to gaussian
+    count = round((variance - FAST_BLUR_PASSES * (lower * lower + 4 * lower + 3)) / (-4 * lower - 4))
+    return tuple(max(1, lower if index < count else lower + 2) for index in range(FAST_BLUR_PASSES))
+
+
+@functools.lru_cache(maxsize=256)
+def rotation_matrix(h : int, w : int, angle : float, expand : bool):
+    """
+    Computes affine matrix and output size of rotation around the center of an image. Results are cached per (shape, angle).
+
+    :type h: int
+    :param h: Height of an image
+
+    :type w: int
+    :param w: Width of an image
+
+    :type angle: float
+    :param angle: Angle in degrees. Counterclockwise if expand is False, clockwise otherwise
+
+    :type expand: bool
+    :param expand: Whether output should be extended to fit whole rotated image
+
+    :rtype: numpy.ndarray, (int, int)
+    :return: Read only 2x3 affine matrix and output size (width, height)
+    """
+
+    center = ((w - 1) / 2, (h - 1) / 2)
+    if not expand:
+        M = cv2.getRotationMatrix2D(center, angle, 1.0)
+        size = (w, h)
+    else:
         M = cv2.getRotationMatrix2D(center, -angle, 1.0)
         (cos, sin) = np.abs(M[0, 0]), np.abs(M[0, 1])
-        new_shape = int((h * sin) + (w * cos)), int((h * cos) + (w * sin))
-        M[0, 2] += (new_shape[0] / 2) - center[0]
-        M[1, 2] += (new_shape[1] / 2) - center[1]
-        return cv2.warpAffine(image, M, (new_shape[0], new_shape[1])), None
\ No newline at end of file
+        size = int(round((h * sin) + (w * cos))), int(round((h * cos) + (w * sin)))
+        M[0, 2] += (size[0] - 1) / 2 - center[0]
+        M[1, 2] += (size[1] - 1) / 2 - center[1]
+    M.setflags(write=False)
+    return M, size
+
+
+def fit_to_canvas(image, h : int, w : int):
+    """
+    Places an image in the center of black canvas of given size, cropping it if it does not fit
+
+    :type image: CV_8U
+    :param image: Image to place
+
+    :type h: int
+    :param h: Height of canvas
+
+    :type w: int
+    :param w: Width of canvas
+
+    :rtype: CV_U8
+    :return: Canvas with the image
+    """
+
+    ih, iw = image.shape[:2]
+    if (ih, iw) == (h, w):
+        return image
+    canvas = np.zeros((h, w) + image.shape[2:], dtype=image.dtype)
+    dy, dx = (h - ih) // 2, (w - iw) // 2
+    src = image[max(-dy, 0):max(-dy, 0) + min(h, ih), max(-dx, 0):max(-dx, 0) + min(w, iw)]
+    canvas[max(dy, 0):max(dy, 0) + src.shape[0], max(dx, 0):max(dx, 0) + src.shape[1]] = src
+    return canvas
@@ -0,0 +1,266 @@
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+
+# ids created by Job, anything else is never looked up in the shared directory
+JOB_ID = re.compile('^[0-9a-f]{32}$')
+
+# interval of polling shared directory while waiting for a job of another process
+POLL_INTERVAL = 0.1
+
+
+class Job:
+    """
+    Single asynchronous job
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.state = JOB_PENDING
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self.done = threading.Event()
+
+
+class JobManager:
+    """
+    Runs expensive processing in background on local worker pool.
+    Number of unfinished jobs is bounded and finished jobs are forgotten after result TTL.
+    Jobs are run by the process that accepted them. If directory is given, state and result of every job is also stored there,
+    so jobs can be polled and cancelled through any gunicorn worker.
+    """
+
+    def __init__(self, workers : int, max_pending : int, ttl : float, directory : str = None):
+        """
+        :type workers: int
+        :param workers: Number of worker threads
+
+        :type max_pending: int
+        :param max_pending: Maximum number of pending and running jobs
+
+        :type ttl: float
+        :param ttl: Number of seconds finished job is kept
+
+        :type directory: string
+        :param directory: Directory shared by worker processes, None keeps jobs only in memory of this process
+        """
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.directory = directory
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.swept = time.time()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def submit(self, function):
+        """
+        Schedules function on worker pool
+
+        :type function: function
+        :param function: function without parameters returning job result
+
+        :rtype: Job, string
+        :return: Created job and None. If queue is full returns None and error
+        """
+
+        with self.lock:
+            self._expire()
+            unfinished = sum(1 for job in self.jobs.values() if job.state in (JOB_PENDING, JOB_RUNNING))
+            if unfinished >= self.max_pending:
+                return None, "Too many pending jobs, try again later"
+            job = Job()
+            self.jobs[job.id] = job
+            self._store(job)
+        job.future = self.executor.submit(self._run, job, function)
+        return job, None
+
+    def _run(self, job, function):
+        with self.lock:
+            if job.state == JOB_PENDING and self._cancel_requested(job.id):
+                self._cancel(job)
+            if job.state == JOB_CANCELLED:
+                return
+            job.state = JOB_RUNNING
+            self._store(job)
+        result = None
+        try:
+            result = function()
+        finally:
+            with self.lock:
+                if job.state == JOB_RUNNING and self._cancel_requested(job.id):
+                    self._cancel(job)
+                elif job.state == JOB_RUNNING:
+                    job.state = JOB_DONE
+                    job.result = result
+                    job.finished = time.time()
+            # result is written outside of the lock, it may be big
+            self._store(job)
+            job.done.set()
+
+    def get(self, job_id : str, wait : float = 0):
+        """
+        Returns job, optionally waits until it is finished (long polling).
+        Jobs of other processes are read from shared directory
+
+        :type job_id: string
+        :param job_id: Id of job
+
+        :type wait: float
+        :param wait: Maximum number of seconds to wait for job to finish
+
+        :rtype: Job
+        :return: Job or None if it does not exist or expired
+        """
+
+        with self.lock:
+            self._expire()
+            job = self.jobs.get(job_id)
+            if job is not None and job.state in (JOB_PENDING, JOB_RUNNING) and self._cancel_requested(job_id):
+                self._cancel(job)
+        if job is None:
+            return self._load(job_id, wait)
+        if wait > 0:
+            job.done.wait(wait)
+        return job
+
+    def cancel(self, job_id : str):
+        """
+        Cancels job. Pending job is not started, result of running job is discarded.
+        Jobs of other processes are cancelled through shared directory
+
+        :type job_id: string
+        :param job_id: Id of job
+
+        :rtype: bool
+        :return: True if job existed and was not finished
+        """
+
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                stored = self._load(job_id)
+                if stored is None or stored.state in (JOB_DONE, JOB_CANCELLED):
+                    return False
+                # process running the job checks for this file before and after running it
+                try:
+                    open(self._path(job_id, '.cancel'), 'x').close()
+                except FileExistsError:
+                    pass
+                except OSError:
+                    return False
+                return True
+            if job.state in (JOB_DONE, JOB_CANCELLED):
+                return False
+            self._cancel(job)
+        if job.future is not None:
+            job.future.cancel()
+        return True
+
+    def _cancel(self, job):
+        job.state = JOB_CANCELLED
+        job.result = None
+        job.finished = time.time()
+        self._store(job)
+        job.done.set()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [job.id for job in self.jobs.values() if job.finished is not None and now - job.finished > self.ttl]:
+            del self.jobs[job_id]
+            self._remove(job_id)
+        # files of jobs whose process exited are removed by other processes
+        if self.directory and now - self.swept > self.ttl:
+            self.swept = now
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                names = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    if name[:32] not in self.jobs and now - os.stat(path).st_mtime > 2 * self.ttl:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, job_id : str, suffix : str = '.job'):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def _store(self, job):
+        if not self.directory:
+            return
+        try:
+            # write to temporary file and rename, so other processes never read partially written job
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((job.state, job.result, job.created, job.finished), f)
+            os.replace(tmp, self._path(job.id))
+        except OSError:
+            pass
+
+    def _remove(self, job_id : str):
+        if not self.directory:
+            return
+        for suffix in ('.job', '.cancel'):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except OSError:
+                pass
+
+    def _cancel_requested(self, job_id : str):
+        return self.directory is not None and os.path.exists(self._path(job_id, '.cancel'))
+
+    def _load(self, job_id : str, wait : float = 0):
+        """
+        Reads job of another process from shared directory, optionally polls it until it is finished
+
+        :rtype: Job
+        :return: Copy of job or None if it does not exist, expired or jobs are not shared
+        """
+
+        if not self.directory or not JOB_ID.match(job_id):
+            return None
+        deadline = time.time() + wait
+        while True:
+            try:
+                with open(self._path(job_id), 'rb') as f:
+                    state, result, created, finished = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return None
+            if finished is not None and time.time() - finished > self.ttl:
+                return None
+            if state in (JOB_PENDING, JOB_RUNNING) and self._cancel_requested(job_id):
+                state = JOB_CANCELLED
+            if state in (JOB_DONE, JOB_CANCELLED) or time.time() >= deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+        job = Job()
+        job.id, job.state, job.result, job.created, job.finished = job_id, state, result, created, finished
+        if finished is not None:
+            job.done.set()
+        return job
+
+
+job_manager = JobManager(
+    int(os.environ.get('JOB_WORKERS', 2)),
+    int(os.environ.get('JOB_QUEUE_DEPTH', 16)),
+    float(os.environ.get('JOB_RESULT_TTL', 300)),
+    os.environ.get('JOB_DIR') or None)
+
+# maximum time of single long poll request
+MAX_WAIT = float(os.environ.get('JOB_MAX_WAIT', 30))
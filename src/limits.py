@@ -0,0 +1,71 @@
+import os
+
+# Limits of uploads. Body size is checked against Content-Length before the body is read,
+# number of pixels is read from image header before the image is decoded.
+
+# maximum size of any request body in bytes, enforced by Flask (also for bodies without Content-Length)
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))
+
+# maximum size of request body of endpoints not listed in BODY_LIMITS
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', 64 * 1024 * 1024))
+
+# maximum number of pixels of an uploaded image for endpoints not listed in PIXEL_LIMITS, 0 disables the check
+MAX_PIXELS = int(os.environ.get('MAX_PIXELS', 200 * 1000 * 1000))
+
+
+def parse_limits(value : str, defaults = None):
+    """
+    Parses per endpoint limits given as comma separated list of path=limit pairs, for example '/batch=536870912,/gauss=1000000'
+
+    :type value: string
+    :param value: limits, empty string or None for defaults only
+
+    :type defaults: dict
+    :param defaults: path -> limit used for paths not given in value
+
+    :rtype: dict
+    :return: path -> limit
+    """
+
+    limits = dict(defaults or {})
+    for item in (value or '').split(','):
+        if item.strip():
+            path, limit = item.rsplit('=', 1)
+            limits[path.strip()] = int(limit)
+    return limits
+
+
+# path of endpoint -> maximum size of request body in bytes, endpoints receiving many images or videos get more
+BODY_LIMITS = parse_limits(os.environ.get('BODY_LIMITS'), {
+    '/batch': 512 * 1024 * 1024,
+    '/frontal/batch': 512 * 1024 * 1024,
+    '/detect/batch': 512 * 1024 * 1024,
+    '/video': MAX_CONTENT_LENGTH,
+})
+
+# path of endpoint -> maximum number of pixels of an uploaded image
+PIXEL_LIMITS = parse_limits(os.environ.get('PIXEL_LIMITS'))
+
+
+def body_limit(path : str):
+    """
+    :type path: string
+    :param path: path of endpoint (url rule, for example '/batch')
+
+    :rtype: int
+    :return: maximum size of request body in bytes
+    """
+
+    return min(BODY_LIMITS.get(path, MAX_BODY_BYTES), MAX_CONTENT_LENGTH)
+
+
+def pixel_limit(path : str):
+    """
+    :type path: string
+    :param path: path of endpoint (url rule, for example '/batch')
+
+    :rtype: int
+    :return: maximum number of pixels of an uploaded image, 0 if it is not limited
+    """
+
+    return PIXEL_LIMITS.get(path, MAX_PIXELS)
@@ -0,0 +1,54 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+
+# When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn configuration) every worker writes its metrics to that directory
+# and /metrics aggregates them, so counters are correct regardless of which worker serves the scrape.
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram('imgproc_stage_seconds', 'Latency of image processing stages (decode, process, encode, response)',
+    ['method', 'stage'], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram('imgproc_request_seconds', 'Latency of processing requests', ['method'], buckets=LATENCY_BUCKETS)
+INPUT_PIXELS = Counter('imgproc_input_pixels', 'Number of decoded input pixels', ['method'])
+INPUT_BYTES = Counter('imgproc_input_bytes', 'Number of uploaded image bytes', ['method'])
+OUTPUT_BYTES = Counter('imgproc_output_bytes', 'Number of encoded output image bytes', ['method'])
+ERRORS = Counter('imgproc_errors', 'Number of failed processing calls', ['method'])
+ADMISSION_REJECTED = Counter('imgproc_admission_rejected', 'Number of requests rejected by admission control', ['lane'])
+ADMISSION_WAIT_SECONDS = Histogram('imgproc_admission_wait_seconds', 'Time requests waited for admission', ['lane'], buckets=LATENCY_BUCKETS)
+
+
+@contextmanager
+def timed(histogram, *labels):
+    """
+    Context manager observing duration of its block in histogram
+
+    :type histogram: prometheus_client.Histogram
+    :param histogram: histogram to observe
+
+    :param labels: values of histogram labels
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - start)
+
+
+def render():
+    """
+    Renders metrics in Prometheus text format, aggregated across workers in multiprocess mode
+
+    :rtype: bytes, string
+    :return: metrics and their content type
+    """
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,194 @@
+import json
+import imageprocessor as improc
+import registry
+import tiling
+
+# step name -> registry.MethodSpec of ImageProcessor method run by the step
+PIPELINE_STEPS = registry.STEPS
+
+# ImageProcessor method name -> names of parameters which are sizes in pixels and are scaled together with the image
+SCALED_PARAMS = registry.SCALED_PARAMS
+
+
+def parse_steps(raw_steps, imageprocessor):
+    """
+    Parses and validates pipeline description. All steps are validated before any image is decoded.
+
+    Pipeline is a json list of steps, for example:
+    [{"method": "gray"}, {"method": "gauss", "params": {"ksize_x": 5, "ksize_y": 5}}, {"method": "canny", "params": {"threshold1": 50, "threshold2": 150}}]
+
+    :type raw_steps: string
+    :param raw_steps: json describing pipeline
+
+    :type imageprocessor: ImageProcessor
+    :param imageprocessor: processor whose methods are executed
+
+    :rtype: [(string, function, list)], string
+    :return: List of steps (step name, bound method, parsed parameters) and None. If pipeline is not correct returns None and error
+    """
+
+    try:
+        steps = json.loads(raw_steps)
+    except (TypeError, ValueError):
+        return None, "Steps should be a json list"
+    if not isinstance(steps, list) or not steps:
+        return None, "Steps should be a non empty json list"
+
+    parsed = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get('method') not in PIPELINE_STEPS:
+            return None, "Step %d: unknown method, available methods: %s" % (index, ", ".join(PIPELINE_STEPS))
+        name = step['method']
+        spec = PIPELINE_STEPS[name]
+        raw_params = step.get('params') or {}
+        if not isinstance(raw_params, dict):
+            return None, "Step %d (%s): params should be a json object" % (index, name)
+        params, error = registry.parse_params(spec, raw_params)
+        if not error:
+            error = registry.validate(imageprocessor, spec.method_name, params)
+        if error:
+            return None, "Step %d (%s): %s" % (index, name, error)
+        parsed.append((name, getattr(imageprocessor, spec.method_name), params))
+    return parsed, None
+
+
+def scale_size(param, value, factor : float):
+    """
+    Scales size parameter, keeping its constraints - odd kernel sizes stay odd, minimum (for example blocksize at least 3) and maximum are kept
+    and 0 disabling an option (blur, face size limits) stays 0
+
+    :type param: registry.Param
+    :param param: Declaration of parameter
+
+    :type value: int
+    :param value: Value of parameter
+
+    :type factor: float
+    :param factor: Scale of the image
+
+    :rtype: int
+    :return: Scaled value, the same value if parameter is not a size
+    """
+
+    if not value or not param.scaled:
+        return value
+    if param.odd:
+        scaled = int(round((value - 1) / 2 * factor)) * 2 + 1
+    else:
+        scaled = int(round(value * factor))
+    scaled = max(param.minimum or 1, scaled)
+    return min(param.maximum, scaled) if param.maximum is not None else scaled
+
+
+def scale_params(method_name : str, params, factor : float):
+    """
+    Scales size parameters (kernel sizes, diameters, block sizes, face sizes) of method, so the result of downscaled image looks like the full size result
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method or 'run_pipeline'
+
+    :type params: list
+    :param params: Parameters of method. For run_pipeline a single element list containing steps
+
+    :type factor: float
+    :param factor: Scale of the image
+
+    :rtype: list
+    :return: Scaled parameters
+    """
+
+    if factor == 1 or not params:
+        return params
+    if method_name == 'run_pipeline':
+        return [[(name, method, scale_params(method.__name__, step_params, factor)) for name, method, step_params in params[0]]]
+    if method_name in registry.SWEEPS:
+        spec = registry.SWEEPS[method_name]
+        swept = [spec.param(name) for name in spec.sweep.swept]
+        passed = [spec.param(name) for name in spec.sweep.passed]
+        if len(swept) == 1:
+            values = [scale_size(swept[0], value, factor) for value in params[0]]
+        else:
+            values = [[scale_size(param, value, factor) for param, value in zip(swept, values)] for values in params[0]]
+        return [values] + [scale_size(param, value, factor) for param, value in zip(passed, params[1:])] + list(params[1 + len(passed):])
+    if method_name not in SCALED_PARAMS:
+        return params
+    spec = registry.BY_METHOD[registry.PARAMS_OF.get(method_name, method_name)]
+    return [scale_size(param, value, factor) for param, value in zip(spec.params, params)] + list(params[len(spec.params):])
+
+
+def final_method_name(method_name : str, params):
+    """
+    Returns name of ImageProcessor method producing the final image
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method or 'run_pipeline'
+
+    :type params: list
+    :param params: Parameters of method. For run_pipeline a single element list containing steps
+
+    :rtype: string
+    :return: Name of method, for pipelines name of method of the last step
+    """
+
+    if method_name == 'run_pipeline':
+        return params[0][-1][1].__name__
+    return method_name
+
+
+def input_color_space(method_name : str, params):
+    """
+    Returns colour space of input image needed by method, see registry.INPUT_COLOR_SPACES
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method or 'run_pipeline'
+
+    :type params: list
+    :param params: Parameters of method. For run_pipeline a single element list containing steps
+
+    :rtype: string
+    :return: imageprocessor.COLOR_GRAY or imageprocessor.COLOR_BGR. For pipelines colour space needed by the first step
+    """
+
+    if method_name == 'run_pipeline':
+        method_name = params[0][0][1].__name__
+    return registry.INPUT_COLOR_SPACES.get(method_name, improc.COLOR_BGR)
+
+
+def describe_steps(steps):
+    """
+    Creates canonical description of parsed steps, used as method name in result cache
+
+    :type steps: [(string, function, list)]
+    :param steps: Steps returned by parse_steps
+
+    :rtype: string
+    :return: Description of steps
+    """
+
+    return 'pipeline:' + json.dumps([[name, params] for name, _, params in steps])
+
+
+def run_pipeline(image, steps):
+    """
+    Runs parsed steps on an image. Intermediate images stay in memory in BGR (or single channel) format,
+    so no colour conversion is done between steps.
+
+    :type image: CV_8U
+    :param image: Decoded BGR image
+
+    :type steps: [(string, function, list)]
+    :param steps: Steps returned by parse_steps
+
+    :rtype: CV_U8, string, [dict]
+    :return: Processed image, None and extra data returned by steps (or None if no step returned extra data). If any step fails returns image and error
+    """
+
+    extras = []
+    for index, (name, method, params) in enumerate(steps):
+        res = tiling.call(method, image, params)
+        if res[1]:
+            return image, "Step %d (%s): %s" % (index, name, res[1]), None
+        image = res[0]
+        if len(res) > 2 and res[2] is not None:
+            extras.append({'step': index, 'method': name, 'extra': res[2]})
+    return image, None, extras or None
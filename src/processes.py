@@ -0,0 +1,185 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+# Methods that keep Python busy (or are simply long) can be run in a pool of processes instead of the request thread.
+# Images are not pickled - input image and output buffer are placed in shared memory blocks and only their names,
+# shapes and dtypes are sent to the worker process, which processes the image in place.
+
+# comma separated names of ImageProcessor methods run in process pool, empty runs every method in the request thread
+PROCESS_METHODS = {name.strip() for name in os.environ.get('PROCESS_METHODS', '').split(',') if name.strip()}
+
+PROCESS_WORKERS = int(os.environ.get('PROCESS_WORKERS', os.cpu_count() or 1))
+
+# size of OpenCV thread pool of every worker process, the pool itself runs images in parallel
+PROCESS_OPENCV_THREADS = int(os.environ.get('PROCESS_OPENCV_THREADS', 1))
+
+
+def same_shape(shape, *params):
+    return shape
+
+
+def gray_shape(shape, *params):
+    return shape[:2]
+
+
+# ImageProcessor method name -> function returning shape of the result from shape of input image and method parameters.
+# Only these methods can be run in process pool, because output buffer is allocated before the method is called.
+SHARED_METHODS = {
+    'median_blur': same_shape,
+    'average_blur': same_shape,
+    'gaussian_blur': same_shape,
+    'bilateral_filter': same_shape,
+    'global_threshold': gray_shape,
+    'mean_threshold': gray_shape,
+    'gaussian_threshold': gray_shape,
+    'sobel': gray_shape,
+    'laplacian': gray_shape,
+    'gradient': lambda shape, ksize, orientation=0: shape[:2] + ((3,) if orientation else ()),
+    'canny_edge_detection': gray_shape,
+    'haar_frontal_face_detection': same_shape,
+}
+
+executor = None
+executor_lock = threading.Lock()
+
+# ImageProcessor of the worker process
+processor = None
+
+
+def init_worker(opencv_threads : int):
+    """
+    Initializes worker process of the pool. Spawned processes would otherwise use OpenCV thread pool sized by all cores
+
+    :type opencv_threads: int
+    :param opencv_threads: size of OpenCV thread pool
+    """
+
+    from cv2 import cv2
+    cv2.setNumThreads(opencv_threads)
+
+
+def get_executor():
+    """
+    Returns process pool, creates it when it is used for the first time, so it is not forked together with preloaded app.
+    Workers are spawned, because forking a process running threads is not safe
+
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    :return: process pool
+    """
+
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker, initargs=(PROCESS_OPENCV_THREADS,))
+        return executor
+
+
+def run_shared(method_name : str, params, source, target):
+    """
+    Runs ImageProcessor method in worker process on image stored in shared memory and writes result to shared output buffer
+
+    :type method_name: string
+    :param method_name: Name of ImageProcessor method
+
+    :type params: list
+    :param params: parameters passed to method after image
+
+    :type source: (string, tuple, string)
+    :param source: name of shared memory block, shape and dtype of input image
+
+    :type target: (string, tuple, string)
+    :param target: name of shared memory block, shape and dtype of output buffer
+
+    :rtype: string, any
+    :return: None and extra data returned by method. If method fails returns error and None
+    """
+
+    global processor
+    if processor is None:
+        import imageprocessor
+        processor = imageprocessor.ImageProcessor()
+    source_block = shared_memory.SharedMemory(name=source[0])
+    target_block = shared_memory.SharedMemory(name=target[0])
+    try:
+        res = getattr(processor, method_name)(np.ndarray(source[1], dtype=source[2], buffer=source_block.buf), *params)
+        if res[1]:
+            return res[1], None
+        if res[0].shape != tuple(target[1]):
+            return "Unexpected shape of result of %s: %s" % (method_name, res[0].shape), None
+        np.ndarray(target[1], dtype=target[2], buffer=target_block.buf)[...] = res[0]
+        return None, res[2] if len(res) > 2 else None
+    finally:
+        res = None
+        source_block.close()
+        target_block.close()
+
+
+def call(method, image, params):
+    """
+    Calls ImageProcessor method in process pool. Input image is copied into shared memory once, output is read from shared memory once.
+    If shared memory can not be allocated (for example /dev/shm of a container is too small) method is called in current thread
+
+    :type method: function
+    :param method: ImageProcessor method
+
+    :type image: CV_8U
+    :param image: Image to process
+
+    :type params: list
+    :param params: parameters passed to method after image
+
+    :rtype: tuple
+    :return: Result in the same format as method - (image, error) or (image, error, extra)
+    """
+
+    shape = SHARED_METHODS[method.__name__](image.shape, *params)
+    blocks = []
+    try:
+        source_block = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        blocks.append(source_block)
+        target_block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * image.itemsize, 1))
+        blocks.append(target_block)
+    except OSError:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        return method(image, *params)
+
+    try:
+        np.ndarray(image.shape, dtype=image.dtype, buffer=source_block.buf)[...] = image
+        error, extra = get_executor().submit(run_shared, method.__name__, list(params),
+            (source_block.name, image.shape, image.dtype.str), (target_block.name, shape, image.dtype.str)).result()
+        if error:
+            return image, error, None
+        result = np.ndarray(shape, dtype=image.dtype, buffer=target_block.buf).copy()
+        return result, None, extra
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def backend(method):
+    """
+    Chooses where method is executed - in process pool if it is listed in PROCESS_METHODS, in current thread otherwise
+
+    :type method: function
+    :param method: ImageProcessor method (or function with the same name)
+
+    :rtype: function
+    :return: function with the same signature and name as method
+    """
+
+    name = getattr(method, '__name__', None)
+    if name not in PROCESS_METHODS or name not in SHARED_METHODS or PROCESS_WORKERS <= 0:
+        return method
+
+    def run(image, *params):
+        return call(method, image, params)
+    run.__name__ = name
+    return run
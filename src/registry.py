@@ -0,0 +1,527 @@
+import json
+import math
+import imageprocessor as improc
+
+# Declarative description of image processing methods. Every method is declared once with its parameters (types, ranges, defaults),
+# colour space of input image and kind of output. Endpoints, pages, pipeline steps, parameter validation, scaling of size parameters,
+# default output formats and OpenAPI description are generated from this table.
+
+# output kinds: photo-like image (encoded as jpeg by default) and binary or edge mask (encoded losslessly as png by default)
+OUTPUT_IMAGE = 'image'
+OUTPUT_MASK = 'mask'
+
+# default value of required parameters
+REQUIRED = object()
+
+
+def boolean(value):
+    """
+    Parses flag given as json boolean, number or string ('1', 'true', 'yes')
+
+    :rtype: bool
+    :return: Value of flag
+    """
+
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+# parameter type -> (name used in errors, OpenAPI type)
+TYPE_NAMES = {
+    int: ('an integer', 'integer'),
+    float: ('a number', 'number'),
+    str: ('a string', 'string'),
+    boolean: ('a boolean', 'boolean'),
+}
+
+
+class Param:
+    """
+    Parameter of a method
+    """
+
+    def __init__(self, name : str, type, default = REQUIRED, minimum = None, maximum = None, choices = None, odd : bool = False,
+            scaled : bool = False, description : str = ''):
+        """
+        :type name: string
+        :param name: Name of formData field and pipeline parameter
+
+        :type type: function
+        :param type: int, float, str or boolean, converts raw value
+
+        :param default: Value of optional parameter when it is not given, REQUIRED for required parameters
+
+        :param minimum: Smallest allowed value or None
+
+        :param maximum: Biggest allowed value or None
+
+        :type choices: list
+        :param choices: Allowed values or None
+
+        :type odd: bool
+        :param odd: Whether value has to be odd (0 is allowed if minimum is 0 - it disables the option)
+
+        :type scaled: bool
+        :param scaled: Whether parameter is a size in pixels scaled together with the image (see pipeline.scale_params)
+
+        :type description: string
+        :param description: Description shown in OpenAPI
+        """
+
+        self.name = name
+        self.type = type
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.odd = odd
+        self.scaled = scaled
+        self.description = description
+
+    @property
+    def required(self):
+        return self.default is REQUIRED
+
+    @property
+    def input_type(self):
+        """
+        :rtype: string
+        :return: Kind of input on method page: select, checkbox, number or text
+        """
+
+        if self.choices:
+            return 'select'
+        if self.type is boolean:
+            return 'checkbox'
+        return 'number' if self.type in (int, float) else 'text'
+
+    def parse(self, raw):
+        """
+        Converts and checks raw value. Missing and empty values are replaced with default
+
+        :param raw: Value from formData field (string) or pipeline step (json value), None if it is missing
+
+        :rtype: any, string
+        :return: Parsed value and None. If value is missing or not correct returns None and error
+        """
+
+        if raw is None or raw == '':
+            if self.required:
+                return None, "Parameter %s is required" % self.name
+            return self.default, None
+        try:
+            value = self.type(raw)
+        except (TypeError, ValueError, OverflowError):
+            return None, "Parameter %s should be %s" % (self.name, TYPE_NAMES[self.type][0])
+        # nan passes every comparison below, infinities break OpenCV
+        if isinstance(value, float) and not math.isfinite(value):
+            return None, "Parameter %s should be a finite number" % self.name
+        if self.choices and value not in self.choices:
+            return None, "Parameter %s should be one of: %s" % (self.name, ", ".join(map(str, self.choices)))
+        if self.minimum is not None and value < self.minimum:
+            return None, "Parameter %s should be at least %s" % (self.name, self.minimum)
+        if self.maximum is not None and value > self.maximum:
+            return None, "Parameter %s should be at most %s" % (self.name, self.maximum)
+        if self.odd and value % 2 == 0 and not (value == 0 and self.minimum == 0):
+            return None, "Parameter %s should be an odd number" % self.name
+        return value, None
+
+    def schema(self):
+        """
+        :rtype: dict
+        :return: OpenAPI schema of parameter
+        """
+
+        schema = {'type': TYPE_NAMES[self.type][1]}
+        if not self.required:
+            schema['default'] = self.default
+        if self.minimum is not None:
+            schema['minimum'] = self.minimum
+        if self.maximum is not None:
+            schema['maximum'] = self.maximum
+        if self.choices:
+            schema['enum'] = list(self.choices)
+        description = self.description
+        if self.odd:
+            description += ' Odd number%s.' % (', 0 disables it' if self.minimum == 0 else '')
+        if description:
+            schema['description'] = description.strip()
+        return schema
+
+
+class Sweep:
+    """
+    Variant of a method applying many values of some parameters at once (see /thresh/* and /canny endpoints)
+    """
+
+    def __init__(self, method_name : str, swept, passed):
+        """
+        :type method_name: string
+        :param method_name: Name of ImageProcessor method of the sweep. It takes list of swept values, passed parameters and sheet flag
+
+        :type swept: [string]
+        :param swept: Names of swept parameters. Values of a single parameter are given as a list, values of many parameters as a list of lists
+
+        :type passed: [string]
+        :param passed: Names of other parameters of the method passed to the sweep
+        """
+
+        self.method_name = method_name
+        self.swept = swept
+        self.passed = passed
+
+
+class MethodSpec:
+    """
+    Declaration of ImageProcessor method exposed by API
+    """
+
+    def __init__(self, step : str, method_name : str, title : str, resource : str, paths, params, color_space : str = improc.COLOR_BGR,
+            output : str = OUTPUT_IMAGE, sweep : Sweep = None, description : str = ''):
+        """
+        :type step: string
+        :param step: Name of pipeline step
+
+        :type method_name: string
+        :param method_name: Name of ImageProcessor method
+
+        :type title: string
+        :param title: Name shown on pages
+
+        :type resource: string
+        :param resource: Name of generated Resource class (its lower case version is name of Flask endpoint)
+
+        :type paths: [string]
+        :param paths: Paths of endpoint, the first one is linked from home page
+
+        :type params: [Param]
+        :param params: Parameters in order of method arguments
+
+        :type color_space: string
+        :param color_space: Colour space of input image (imageprocessor.COLOR_BGR or COLOR_GRAY), gray images are decoded directly to single channel
+
+        :type output: string
+        :param output: OUTPUT_IMAGE or OUTPUT_MASK
+
+        :type sweep: Sweep
+        :param sweep: Sweep variant of the method or None
+
+        :type description: string
+        :param description: Description shown in OpenAPI
+        """
+
+        self.step = step
+        self.method_name = method_name
+        self.title = title
+        self.resource = resource
+        self.paths = paths
+        self.params = params
+        self.color_space = color_space
+        self.output = output
+        self.sweep = sweep
+        self.description = description
+
+    def param(self, name : str):
+        return next(param for param in self.params if param.name == name)
+
+
+def ksize(name : str = 'ksize', maximum : int = None):
+    return Param(name, int, minimum=1, maximum=maximum, odd=True, scaled=True, description='Size of kernel in pixels.')
+
+
+def level(name : str, default = REQUIRED, minimum : int = 1, description : str = ''):
+    return Param(name, int, default, minimum=minimum, maximum=255, description=description)
+
+
+METHODS = [
+    MethodSpec('gray', 'to_grayscale', "Grayscale", 'Grayscale', ['/gray'], [], color_space=improc.COLOR_GRAY,
+        description="Converts image to grayscale"),
+    MethodSpec('median', 'median_blur', "Median", 'Median', ['/median'], [ksize()],
+        description="Median blur"),
+    MethodSpec('average', 'average_blur', "Average", 'Average', ['/average'], [ksize('ksize_x'), ksize('ksize_y')],
+        description="Averaging (box) blur"),
+    MethodSpec('gauss', 'gaussian_blur', "Gaussian Blur", 'GaussianBlur', ['/gauss'], [
+        ksize('ksize_x'), ksize('ksize_y'),
+        Param('fast', boolean, False, description="Approximate kernels of size %d and bigger with box filters." % improc.FAST_BLUR_MIN_KSIZE)],
+        description="Gaussian blur"),
+    MethodSpec('bilateral', 'bilateral_filter', "Bilateral filter", 'Bilateral', ['/bilateral'], [
+        Param('d', int, minimum=1, scaled=True, description="Diameter of pixel neighbourhood."),
+        Param('sigma', float, description="Sigma in colour space, must be positive."),
+        Param('engine', str, improc.BILATERAL_ENGINES[0], choices=improc.BILATERAL_ENGINES,
+            description="bilateral - exact filter, guided - guided filter whose cost does not depend on d, auto - guided for d bigger than %d." % improc.BILATERAL_EXACT_MAX_D)],
+        description="Edge preserving smoothing, extra data contains name of engine that was used"),
+    MethodSpec('thresh_global', 'global_threshold', "Global threshold", 'GlobalThresh', ['/thresh/global'], [
+        level('threshold', 0, 0, "Threshold, required unless auto is given."),
+        level('value', description="Value of pixels above threshold."),
+        Param('auto', str, '', choices=tuple(improc.THRESHOLD_AUTO_MODES), description="Automatic threshold replacing threshold.")],
+        color_space=improc.COLOR_GRAY, output=OUTPUT_MASK, sweep=Sweep('global_threshold_sweep', ['threshold'], ['value']),
+        description="Global thresholding, extra data contains used, otsu and triangle thresholds"),
+    MethodSpec('thresh_mean', 'mean_threshold', "Mean threshold", 'MeanThreshold', ['/thresh/mean'], [
+        Param('blocksize', int, minimum=3, odd=True, scaled=True, description="Size of pixel neighbourhood."),
+        Param('c', float, description="Constant subtracted from the mean."),
+        level('value', description="Value of pixels above threshold.")],
+        color_space=improc.COLOR_GRAY, output=OUTPUT_MASK, sweep=Sweep('mean_threshold_sweep', ['blocksize', 'c'], ['value']),
+        description="Adaptive thresholding with mean of the neighbourhood"),
+    MethodSpec('thresh_gauss', 'gaussian_threshold', "Gaussian threshold", 'GaussianThreshold', ['/thresh/gauss'], [
+        Param('blocksize', int, minimum=3, odd=True, scaled=True, description="Size of pixel neighbourhood."),
+        Param('c', float, description="Constant subtracted from the weighted mean."),
+        level('value', description="Value of pixels above threshold.")],
+        color_space=improc.COLOR_GRAY, output=OUTPUT_MASK, sweep=Sweep('gaussian_threshold_sweep', ['blocksize', 'c'], ['value']),
+        description="Adaptive thresholding with gaussian weighted mean of the neighbourhood"),
+    MethodSpec('sobel', 'sobel', "Sobel", 'Sobel', ['/sobel'], [
+        Param('dx', int, minimum=0, maximum=1, description="Order of x derivative."),
+        Param('dy', int, minimum=0, maximum=1, description="Order of y derivative."),
+        Param('ksize', int, minimum=1, maximum=31, odd=True, description="Size of kernel."),
+        Param('delta', float, description="Value added to the result.")],
+        color_space=improc.COLOR_GRAY, description="Sobel derivative"),
+    MethodSpec('laplacian', 'laplacian', "Laplacian", 'Laplacian', ['/laplacian'], [
+        Param('ksize', int, minimum=1, maximum=31, odd=True, description="Size of kernel."),
+        Param('delta', float, description="Value added to the result.")],
+        color_space=improc.COLOR_GRAY, description="Laplacian"),
+    MethodSpec('gradient', 'gradient', "Gradient", 'Gradient', ['/gradient'], [
+        Param('ksize', int, minimum=1, maximum=31, odd=True, description="Size of kernel."),
+        Param('orientation', int, 0, minimum=0, maximum=1, description="1 returns orientation coded as hue and magnitude as brightness.")],
+        color_space=improc.COLOR_GRAY, description="Magnitude and orientation of sobel gradient"),
+    MethodSpec('canny', 'canny_edge_detection', "Canny", 'Canny', ['/canny'], [
+        level('threshold1', description="First threshold of hysteresis."),
+        level('threshold2', description="Second threshold of hysteresis."),
+        Param('blur', int, 0, minimum=0, odd=True, scaled=True, description="Size of gaussian kernel applied before detection."),
+        Param('l2', boolean, False, description="Use L2 norm of gradient.")],
+        color_space=improc.COLOR_GRAY, output=OUTPUT_MASK, sweep=Sweep('canny_sweep', ['threshold1', 'threshold2'], ['blur', 'l2']),
+        description="Canny edge detector"),
+    MethodSpec('frontal', 'haar_frontal_face_detection', "Frontal face detection", 'FrontalFace', ['/frontal', '/detect'], [
+        Param('min_neighbours', int, minimum=1, description="Number of neighbours every candidate rectangle should have."),
+        Param('scale', float, description="How much the image is reduced at each scale, must be greater than 1."),
+        Param('min_size', int, 0, minimum=0, scaled=True, description="Minimum size of a face in pixels, 0 for no limit."),
+        Param('max_size', int, 0, minimum=0, scaled=True, description="Maximum size of a face in pixels, 0 for no limit."),
+        Param('max_detection_dim', int, improc.DETECTION_MAX_DIM, minimum=0, description="Bigger images are downscaled before detection, 0 disables downscaling."),
+        Param('cascade', str, improc.DEFAULT_CASCADE, description="Name of haar cascade.")],
+        description="Haar cascade face detection, extra data contains coordinates of faces"),
+    MethodSpec('rotation_naive', 'naive_rotate', "Naive rotation", 'RotationNaive', ['/rotation/naive'], [
+        Param('angle', float, description="Angle in degrees, counterclockwise.")],
+        description="Rotation keeping size of the image"),
+    MethodSpec('rotation', 'rotate', "Rotation", 'Rotation', ['/rotation'], [
+        Param('angle', float, description="Angle in degrees, clockwise.")],
+        description="Rotation enlarging the image so nothing is cut off"),
+]
+
+# pipeline step name -> method
+STEPS = {spec.step: spec for spec in METHODS}
+
+# ImageProcessor method name -> method
+BY_METHOD = {spec.method_name: spec for spec in METHODS}
+
+# ImageProcessor method name -> name of declared method whose parameters it takes
+PARAMS_OF = {'detect_frontal_faces': 'haar_frontal_face_detection'}
+
+# ImageProcessor sweep method name -> method
+SWEEPS = {spec.sweep.method_name: spec for spec in METHODS if spec.sweep}
+
+# ImageProcessor method name -> colour space of input image (see imageprocessor.COLOR_GRAY)
+INPUT_COLOR_SPACES = {name: spec.color_space for name, spec in list(BY_METHOD.items()) + list(SWEEPS.items())}
+INPUT_COLOR_SPACES['detect_frontal_faces'] = improc.COLOR_GRAY
+
+# ImageProcessor method name -> output kind
+OUTPUTS = {name: spec.output for name, spec in list(BY_METHOD.items()) + list(SWEEPS.items())}
+
+# ImageProcessor method name -> names of parameters which are sizes in pixels and are scaled together with the image
+SCALED_PARAMS = {spec.method_name: {param.name for param in spec.params if param.scaled} for spec in METHODS if any(param.scaled for param in spec.params)}
+SCALED_PARAMS.update({name: SCALED_PARAMS[declared] for name, declared in PARAMS_OF.items() if declared in SCALED_PARAMS})
+
+
+def parse_params(spec : MethodSpec, raw, names = None):
+    """
+    Parses parameters of method
+
+    :type spec: MethodSpec
+    :param spec: Method
+
+    :type raw: dict
+    :param raw: Raw values by parameter name (formData or params of pipeline step)
+
+    :type names: [string]
+    :param names: Names of parsed parameters, None parses all of them
+
+    :rtype: list, string
+    :return: Parameters in order of method arguments and None. If any parameter is missing or not correct returns None and error
+    """
+
+    params = []
+    for param in spec.params:
+        if names is not None and param.name not in names:
+            continue
+        value, error = param.parse(raw.get(param.name))
+        if error:
+            return None, error
+        params.append(value)
+    return params, None
+
+
+def parse_sweep(spec : MethodSpec, raw : str):
+    """
+    Parses swept values - json list of values, or of lists of values when more than one parameter is swept (for example [[11, 2], [15, 5]])
+
+    :type spec: MethodSpec
+    :param spec: Method with sweep
+
+    :type raw: string
+    :param raw: json list
+
+    :rtype: list, string
+    :return: Swept values and None. If sweep is not correct returns None and error
+    """
+
+    params = [spec.param(name) for name in spec.sweep.swept]
+    try:
+        sweep = json.loads(raw)
+    except (TypeError, ValueError):
+        sweep = None
+    if len(params) == 1:
+        if not isinstance(sweep, list):
+            return None, "sweep should be a json list of %s values" % TYPE_NAMES[params[0].type][1]
+        sets = [[value] for value in sweep]
+    else:
+        if not isinstance(sweep, list) or not all(isinstance(values, list) and len(values) == len(params) for values in sweep):
+            return None, "sweep should be a json list of [%s] lists" % ", ".join(param.name for param in params)
+        sets = sweep
+
+    values = []
+    for raw_values in sets:
+        parsed = []
+        for param, raw_value in zip(params, raw_values):
+            value, error = param.parse(raw_value)
+            if error:
+                return None, "sweep: %s" % error
+            parsed.append(value)
+        values.append(parsed[0] if len(params) == 1 else parsed)
+    return values, None
+
+
+def validate(imageprocessor, method_name : str, params):
+    """
+    Runs validate_<method> of ImageProcessor, which checks constraints between parameters
+
+    :rtype: string
+    :return: Error or None
+    """
+
+    validator = getattr(imageprocessor, 'validate_' + method_name, None)
+    return validator(*params) if validator else None
+
+
+def parse_request(spec : MethodSpec, form, imageprocessor):
+    """
+    Parses and validates parameters of method sent in formData, before any image is decoded.
+    If 'sweep' field is given and method has a sweep, sweep method is used (with optional 'sheet' flag)
+
+    :type spec: MethodSpec
+    :param spec: Method
+
+    :type form: dict
+    :param form: formData fields
+
+    :type imageprocessor: ImageProcessor
+    :param imageprocessor: processor whose method is returned
+
+    :rtype: function, list, string
+    :return: Bound ImageProcessor method, its parameters and None. If parameters are not correct returns None, None and error
+    """
+
+    if spec.sweep and 'sweep' in form:
+        values, error = parse_sweep(spec, form['sweep'])
+        if error:
+            return None, None, error
+        passed, error = parse_params(spec, form, spec.sweep.passed)
+        if error:
+            return None, None, error
+        method_name = spec.sweep.method_name
+        params = [values] + passed + [boolean(form.get('sheet', ''))]
+    else:
+        method_name = spec.method_name
+        params, error = parse_params(spec, form)
+        if error:
+            return None, None, error
+    error = validate(imageprocessor, method_name, params)
+    if error:
+        return None, None, error
+    return getattr(imageprocessor, method_name), params, None
+
+
+def form_schema(params, required = ()):
+    """
+    :type params: [Param]
+    :param params: formData fields
+
+    :rtype: dict
+    :return: OpenAPI schema of multipart/form-data body
+    """
+
+    schema = {'type': 'object', 'properties': {param.name: param.schema() for param in params}}
+    required = list(required) + [param.name for param in params if param.required]
+    if required:
+        schema['required'] = required
+    return schema
+
+
+def openapi(options, title : str = 'OpenCV imageproc', version : str = '1.0'):
+    """
+    Generates OpenAPI description of method endpoints, /pipeline and /batch
+
+    :type options: [Param]
+    :param options: Optional formData fields accepted by every method endpoint (max_dim, format, ...)
+
+    :rtype: dict
+    :return: OpenAPI 3 document
+    """
+
+    image = {'type': 'string', 'format': 'binary', 'description': 'Image to process'}
+    responses = {
+        '200': {'description': 'Processed image. json (base64 image in status field, or success false and err), raw image or multipart/mixed, negotiated with Accept header',
+            'content': {'application/json': {}, 'image/*': {}, 'multipart/mixed': {}}},
+        '202': {'description': 'Asynchronous job was created, see Location header'},
+        '400': {'description': 'Parameters are not correct (clients not accepting json)'},
+        '413': {'description': 'Request body or image is too big'},
+        '429': {'description': 'Server is overloaded, retry after number of seconds in Retry-After header'},
+    }
+    sweep_options = [Param('sweep', str, '', description='json list of swept values'), Param('sheet', boolean, False, description='Combine results of sweep into a single contact sheet.')]
+
+    paths = {}
+    for spec in METHODS:
+        schema = form_schema(spec.params + options + (sweep_options if spec.sweep else []), ['image'])
+        schema['properties']['image'] = image
+        description = spec.description
+        if spec.sweep:
+            description += '. With sweep field %s are taken from it (json list%s) and many images are returned' % (
+                ', '.join(spec.sweep.swept), ' of lists' if len(spec.sweep.swept) > 1 else '')
+        operation = {
+            'summary': spec.title,
+            'description': description,
+            'operationId': spec.step,
+            'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': schema}}},
+            'responses': responses,
+        }
+        for path in spec.paths:
+            paths[path] = {'post': operation}
+
+    steps = {'type': 'array', 'minItems': 1, 'items': {'oneOf': [{
+        'type': 'object',
+        'title': spec.step,
+        'properties': {'method': {'type': 'string', 'enum': [spec.step]}, 'params': form_schema(spec.params)},
+        'required': ['method'],
+    } for spec in METHODS]}}
+    pipeline = form_schema(options, ['image', 'steps'])
+    pipeline['properties'].update({'image': image, 'steps': {'type': 'string', 'description': 'json list of steps, see components/schemas/Steps'}})
+    batch = form_schema(options, ['images', 'steps'])
+    batch['properties'].update({'images': {'type': 'array', 'items': image}, 'steps': pipeline['properties']['steps']})
+    paths['/pipeline'] = {'post': {'summary': 'Pipeline', 'description': 'Runs steps one after another on a single image', 'operationId': 'pipeline',
+        'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': pipeline}}}, 'responses': responses}}
+    paths['/batch'] = {'post': {'summary': 'Batch', 'description': 'Runs steps on many images, results are returned in order of upload', 'operationId': 'batch',
+        'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': batch}}}, 'responses': responses}}
+
+    return {
+        'openapi': '3.0.3',
+        'info': {'title': title, 'version': version},
+        'paths': paths,
+        'components': {'schemas': {'Steps': steps}},
+    }
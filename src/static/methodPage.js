@@ -4,7 +4,8 @@ function onClickMethod(endpoint, variables){
 	// loop to iterate through all parameters and save them in formData
 	for (let varbl of variables){
 		if(varbl != ""){
-			v = document.getElementById(varbl).value
+			element = document.getElementById(varbl)
+			v = element.type == 'checkbox' ? (element.checked ? '1' : '') : element.value
 			if(v != 'undefined' && v != null && v != "")
 				data.append(varbl, v)
 		}
@@ -36,10 +37,11 @@ function onClickMethod(endpoint, variables){
 
 					bytestring = data['status']
 					image = bytestring.split('\'')[1]
-					resultImageBox.attr('src' , 'data:image/jpeg;base64,'+image) // display image from response
+					mimetype = data['mimetype'] || 'image/jpeg'
+					resultImageBox.attr('src' , 'data:' + mimetype + ';base64,'+image) // display image from response
 
 					if(data['extra']) // display extra data if they appear in response
-						document.getElementById('extraResult').innerHTML = data['extra'];
+						document.getElementById('extraResult').textContent = JSON.stringify(data['extra']);
 				}
 			});
 		}
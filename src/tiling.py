@@ -0,0 +1,132 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import imageprocessor as improc
+import processes
+
+# images with more pixels than this are processed in tiles, 0 disables tiling
+TILE_MIN_PIXELS = int(os.environ.get('TILE_MIN_PIXELS', 16 * 1000 * 1000))
+
+# size of the side of a tile (without halo)
+TILE_SIZE = int(os.environ.get('TILE_SIZE', 1024))
+
+# maximum memory used by tiles processed at once
+TILE_MEMORY_LIMIT = int(os.environ.get('TILE_MEMORY_LIMIT', 256 * 1024 * 1024))
+
+TILE_WORKERS = int(os.environ.get('TILE_WORKERS', os.cpu_count() or 1))
+
+executor = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix='tile')
+
+# ImageProcessor method name -> (function returning halo size from method parameters, bytes of working memory per input byte)
+# Halo is the radius of the pixel neighbourhood, so tiles extended by it give the same result as processing the whole image.
+# Function returns None for parameters whose result depends on more than a bounded neighbourhood, such images are not tiled.
+TILED_METHODS = {
+    'median_blur': (lambda ksize: ksize // 2, 2),
+    'average_blur': (lambda ksize_x, ksize_y: max(ksize_x, ksize_y) // 2, 3),
+    'gaussian_blur': (lambda ksize_x, ksize_y, fast=False: max(ksize_x, ksize_y) // 2, 3),
+    # guided filter engine computes its coefficients on a downscaled grid aligned to the image origin, so only exact filter is tiled
+    'bilateral_filter': (lambda d, sigma, engine='auto': d // 2 if improc.bilateral_engine(d, engine) == 'bilateral' else None, 3),
+    'mean_threshold': (lambda blocksize, c, value: blocksize // 2, 3),
+    'gaussian_threshold': (lambda blocksize, c, value: blocksize // 2, 3),
+    'sobel': (lambda dx, dy, ksize, delta: max(ksize // 2, 1), 5),
+    'laplacian': (lambda ksize, delta: max(ksize // 2, 1), 5),
+    # angle approximation of cv2.cartToPolar depends on position of a pixel in the row (vectorised and scalar paths), so orientation is not tiled
+    'gradient': (lambda ksize, orientation=0: None if orientation else max(ksize // 2, 1), 21),
+    # canny is not tiled, its hysteresis follows weak edges across the whole image
+}
+
+
+def tile_concurrency(tile_bytes : int):
+    """
+    Computes number of tiles that can be processed at once without exceeding TILE_MEMORY_LIMIT
+
+    :type tile_bytes: int
+    :param tile_bytes: Working memory of single tile
+
+    :rtype: int
+    :return: Number of tiles processed at once
+    """
+
+    return max(1, min(TILE_WORKERS, TILE_MEMORY_LIMIT // max(tile_bytes, 1)))
+
+
+def run_tiled(image, function, halo : int, tile_size : int = TILE_SIZE, bytes_factor : int = 3):
+    """
+    Processes an image in tiles extended by halo and stitches results into a single output image.
+    Tiles are processed in parallel, number of tiles processed at once is limited by TILE_MEMORY_LIMIT.
+
+    :type image: CV_8U
+    :param image: Image to process
+
+    :type function: function
+    :param function: function processing a tile, returns tuple (image, error, ...) like ImageProcessor methods.
+        Result must have the same size as the tile
+
+    :type halo: int
+    :param halo: Number of pixels each tile is extended by on every side
+
+    :type tile_size: int
+    :param tile_size: Size of the side of a tile
+
+    :type bytes_factor: int
+    :param bytes_factor: Working memory of function per byte of a tile
+
+    :rtype: tuple
+    :return: Result in the same format as function - stitched image, None and remaining values of the first tile result. If any tile fails returns original image and error
+    """
+
+    h, w = image.shape[:2]
+    boxes = [(y, min(y + tile_size, h), x, min(x + tile_size, w)) for y in range(0, h, tile_size) for x in range(0, w, tile_size)]
+    channels = image.shape[2] if image.ndim == 3 else 1
+    concurrency = tile_concurrency((tile_size + 2 * halo) ** 2 * channels * image.itemsize * bytes_factor)
+
+    def process(box):
+        y0, y1, x0, x1 = box
+        top, left = max(y0 - halo, 0), max(x0 - halo, 0)
+        res = function(np.ascontiguousarray(image[top:min(y1 + halo, h), left:min(x1 + halo, w)]))
+        if res[1]:
+            return res
+        return (res[0][y0 - top:y1 - top, x0 - left:x1 - left],) + tuple(res[1:])
+
+    output = None
+    first = None
+    for start in range(0, len(boxes), concurrency):
+        window = boxes[start:start + concurrency]
+        for box, res in zip(window, executor.map(process, window)):
+            if res[1]:
+                return (image,) + tuple(res[1:])
+            if output is None:
+                first = res
+                output = np.empty((h, w) + res[0].shape[2:], dtype=res[0].dtype)
+            y0, y1, x0, x1 = box
+            output[y0:y1, x0:x1] = res[0]
+    return (output,) + tuple(first[1:])
+
+
+def call(method, image, params = None):
+    """
+    Calls ImageProcessor method, big images are processed in tiles if the method supports it
+
+    :type method: function
+    :param method: ImageProcessor method (or function wrapping it with the same name)
+
+    :type image: CV_8U
+    :param image: Image to process
+
+    :type params: list
+    :param params: parameters passed to method after image
+
+    :rtype: tuple
+    :return: Result of method
+    """
+
+    params = params or []
+    spec = TILED_METHODS.get(getattr(method, '__name__', None))
+    method = processes.backend(method)
+    if spec is None or TILE_MIN_PIXELS <= 0 or image.shape[0] * image.shape[1] <= TILE_MIN_PIXELS:
+        return method(image, *params)
+    halo, bytes_factor = spec
+    halo = halo(*params)
+    if halo is None:
+        return method(image, *params)
+    return run_tiled(image, lambda tile: method(tile, *params), max(halo, 0), bytes_factor=bytes_factor)
@@ -0,0 +1,304 @@
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cv2 import cv2
+
+VIDEO_WORKERS = int(os.environ.get('VIDEO_WORKERS', 2))
+
+# maximum number of frames being processed at once, bounds memory used by single stream
+VIDEO_WINDOW = int(os.environ.get('VIDEO_WINDOW', VIDEO_WORKERS * 2))
+
+CHUNK_SIZE = 64 * 1024
+
+# maximum size of single MJPEG frame, protects from streams without JPEG end markers
+MAX_FRAME_SIZE = 32 * 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=VIDEO_WORKERS, thread_name_prefix='video')
+
+
+def spool_to_file(stream, suffix = ''):
+    """
+    Copies uploaded stream to temporary file in chunks, so video does not have to fit in memory
+
+    :type stream: file
+    :param stream: uploaded file stream
+
+    :rtype: string
+    :return: Path of temporary file. Caller is responsible for removing it
+    """
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(stream, f, CHUNK_SIZE)
+    return path
+
+
+def upload_path(stream, suffix = ''):
+    """
+    Returns path of uploaded file. Uploads already spooled to a named file (see app.UploadRequest) are used in place,
+    other streams are copied to temporary file with spool_to_file
+
+    :type stream: file
+    :param stream: uploaded file stream
+
+    :rtype: string, bool
+    :return: Path of the file and whether it is a temporary copy the caller is responsible for removing
+    """
+
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        stream.flush()
+        return name, False
+    return spool_to_file(stream, suffix), True
+
+
+def remove_file(path : str):
+    """
+    Removes file if it still exists
+
+    :type path: string
+    :param path: Path of file
+    """
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def capture_fps(path : str, default : float = 25.0):
+    """
+    Reads frame rate of video file
+
+    :type path: string
+    :param path: Path of video file
+
+    :rtype: float
+    :return: Frame rate or default if it is unknown
+    """
+
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps and fps > 0 else default
+
+
+def capture_frames(path : str, remove : bool = False):
+    """
+    Generator decoding frames of video file one by one
+
+    :type path: string
+    :param path: Path of video file
+
+    :type remove: bool
+    :param remove: Whether file should be removed after all frames are read or generator is closed
+
+    :rtype: generator of CV_8U
+    :return: BGR frames
+    """
+
+    capture = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        capture.release()
+        if remove:
+            os.remove(path)
+
+
+def mjpeg_frames(stream, grayscale : bool = False):
+    """
+    Generator decoding frames of MJPEG stream (concatenated JPEG images, optionally separated by multipart boundaries).
+    Frames are found by JPEG start and end markers, so only one frame is kept in memory.
+
+    :type stream: file
+    :param stream: MJPEG stream
+
+    :type grayscale: bool
+    :param grayscale: whether frames should be decoded directly to single channel grayscale images
+
+    :rtype: generator of CV_8U
+    :return: BGR or grayscale frames
+    """
+
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        while True:
+            start = buffer.find(b'\xff\xd8')
+            if start < 0:
+                del buffer[:-1]
+                break
+            end = buffer.find(b'\xff\xd9', start + 2)
+            if end < 0:
+                del buffer[:start]
+                if len(buffer) > MAX_FRAME_SIZE:
+                    return
+                break
+            frame = cv2.imdecode(np.frombuffer(buffer, np.uint8, end + 2 - start, start), flags)
+            del buffer[:end + 2]
+            if frame is not None:
+                yield frame
+
+
+def peek(frames):
+    """
+    Reads the first frame, so its size is known before processing starts
+
+    :type frames: generator of CV_8U
+    :param frames: decoded frames
+
+    :rtype: CV_8U, generator
+    :return: First frame (None for empty input) and generator of all frames including the first one.
+        Closing the returned generator before it is iterated does not close frames, caller has to close them
+    """
+
+    first = next(frames, None)
+
+    def chained():
+        try:
+            if first is not None:
+                yield first
+                yield from frames
+        finally:
+            if hasattr(frames, 'close'):
+                frames.close()
+
+    return first, chained()
+
+
+def process_ordered(frames, function):
+    """
+    Processes frames on video worker pool keeping their order. At most VIDEO_WINDOW frames are processed at once,
+    so memory usage does not depend on length of the video.
+
+    :type frames: generator of CV_8U
+    :param frames: decoded frames
+
+    :type function: function
+    :param function: function called with each frame
+
+    :rtype: generator
+    :return: Results of function in order of frames
+    """
+
+    pending = deque()
+    try:
+        for frame in frames:
+            pending.append(executor.submit(function, frame))
+            if len(pending) >= VIDEO_WINDOW:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if hasattr(frames, 'close'):
+            frames.close()
+
+
+def mjpeg_body(results, boundary : str, mimetype : str, extra_to_header = None):
+    """
+    Generator of multipart/x-mixed-replace body
+
+    :type results: generator of (bytes, string, any)
+    :param results: encoded frames, errors and extra data
+
+    :type boundary: string
+    :param boundary: multipart boundary
+
+    :type mimetype: string
+    :param mimetype: mimetype of encoded frames
+
+    :type extra_to_header: function
+    :param extra_to_header: function converting extra data to value of X-Extra part header
+
+    :rtype: generator of bytes
+    :return: parts of response body. Stream ends at first frame that could not be processed
+    """
+
+    for encoded, error, extra in results:
+        if error:
+            break
+        headers = 'Content-Type: %s\r\nContent-Length: %d\r\n' % (mimetype, len(encoded))
+        if extra is not None and extra_to_header:
+            headers += 'X-Extra: %s\r\n' % extra_to_header(extra)
+        yield ('--%s\r\n%s\r\n' % (boundary, headers)).encode() + encoded + b'\r\n'
+    yield ('--%s--\r\n' % boundary).encode()
+
+
+def write_video(results, fps : float):
+    """
+    Writes processed frames to temporary MJPG encoded AVI file
+
+    :type results: generator of (CV_8U, string, any)
+    :param results: processed frames, errors and extra data
+
+    :type fps: float
+    :param fps: frame rate of output video
+
+    :rtype: string, string
+    :return: Path of video file and None. If no frame could be processed returns None and error. Caller is responsible for removing the file
+    """
+
+    fd, path = tempfile.mkstemp(suffix='.avi')
+    os.close(fd)
+    writer = None
+    error = None
+    written = False
+    try:
+        for image, error, _ in results:
+            if error:
+                break
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            if writer is None:
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (image.shape[1], image.shape[0]))
+            writer.write(image)
+        written = writer is not None and not error
+    finally:
+        if writer is not None:
+            writer.release()
+        # file is removed also when processing or encoding raises
+        if not written:
+            remove_file(path)
+    if not written:
+        return None, error or "Video does not contain any frames"
+    return path, None
+
+
+def file_chunks(path : str, remove : bool = True):
+    """
+    Generator reading file in chunks
+
+    :type path: string
+    :param path: Path of file
+
+    :type remove: bool
+    :param remove: Whether file should be removed when it is read
+
+    :rtype: generator of bytes
+    :return: file content
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
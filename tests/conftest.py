@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules of the service import each other by plain names, as when the app is started from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
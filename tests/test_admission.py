@@ -0,0 +1,71 @@
+import io
+import threading
+import time
+import numpy as np
+import pytest
+from cv2 import cv2
+import admission
+import app as service
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    # heavy lane with budget of 100 ms, everything above 1 ms is heavy, requests are rejected after 0.1 s of waiting
+    controller = admission.AdmissionController(100, 1, 100, 0.1)
+    monkeypatch.setattr(admission, 'admission_controller', controller)
+    return controller
+
+
+@pytest.fixture
+def client():
+    service.app.config['TESTING'] = True
+    with service.app.test_client() as client:
+        yield client
+
+
+def jpeg(h = 480, w = 640):
+    return cv2.imencode('.jpg', np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8))[1].tobytes()
+
+
+def test_blocking_acquire_waits_for_budget(controller):
+    lane, _ = controller.acquire(100)
+    assert controller.acquire(50) == (None, 1)
+    admitted = []
+    thread = threading.Thread(target=lambda: admitted.append(controller.acquire(50, block=True)))
+    thread.start()
+    time.sleep(0.2)
+    assert not admitted
+    controller.release(lane, 100)
+    thread.join(1)
+    assert admitted == [(admission.LANE_HEAVY, None)]
+
+
+def test_async_job_waits_for_admission(controller, client):
+    lane, _ = controller.acquire(100)
+    try:
+        response = client.post('/median', data={'image': (io.BytesIO(jpeg()), 'image.jpg'), 'ksize': 15, 'async': 1})
+        assert response.status_code == 202
+        location = response.get_json()['location']
+        time.sleep(0.2)
+        assert client.get(location).status_code == 202
+    finally:
+        controller.release(lane, 100)
+    assert client.get(location + '?wait=5').status_code == 200
+    assert controller.stats()[admission.LANE_HEAVY]['in_flight_ms'] == 0
+
+
+def test_video_is_rejected_when_overloaded(controller, client):
+    steps = '[{"method": "median", "params": {"ksize": 15}}]'
+    body = jpeg() * 3
+    lane, _ = controller.acquire(100)
+    try:
+        response = client.post('/video?steps=' + steps, data=body, content_type='video/x-motion-jpeg')
+        assert response.status_code == 429
+        assert response.headers['Retry-After']
+    finally:
+        controller.release(lane, 100)
+    response = client.post('/video?steps=' + steps, data=body, content_type='video/x-motion-jpeg')
+    assert response.status_code == 200
+    assert response.data.count(b'Content-Type: image/jpeg') == 3
+    response.close()
+    assert controller.stats()[admission.LANE_HEAVY]['in_flight_ms'] == 0
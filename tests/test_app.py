@@ -0,0 +1,102 @@
+import io
+import json
+import re
+import numpy as np
+import pytest
+from cv2 import cv2
+import app as service
+
+
+@pytest.fixture
+def client():
+    service.app.config['TESTING'] = True
+    with service.app.test_client() as client:
+        yield client
+
+
+def png(h = 48, w = 64):
+    image = np.zeros((h, w, 3), dtype=np.uint8)
+    image[:, w // 2:] = (40, 120, 200)
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+def post(client, path, data = None, headers = None, image = None):
+    form = dict(data or {})
+    form['image'] = (io.BytesIO(image or png()), 'image.png')
+    return client.post(path, data=form, headers=headers or {}, content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('accept, mimetype', [
+    ('image/jpeg', 'image/jpeg'),
+    ('image/png', 'image/png'),
+    ('image/webp', 'image/webp'),
+    ('image/*', 'image/jpeg'),
+    ('image/png, application/json;q=0.5', 'image/png'),
+])
+def test_image_accept_returns_binary_image(client, accept, mimetype):
+    response = post(client, '/gray', headers={'Accept': accept})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == mimetype
+    assert cv2.imdecode(np.frombuffer(response.data, np.uint8), cv2.IMREAD_UNCHANGED) is not None
+
+
+def test_format_field_matching_accept_is_used(client):
+    response = post(client, '/gray', {'format': 'webp'}, headers={'Accept': 'image/*'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'image/webp'
+
+
+@pytest.mark.parametrize('accept, data', [
+    ('image/gif', {}),
+    ('image/png', {'format': 'jpeg'}),
+])
+def test_unacceptable_image_type_returns_406(client, accept, data):
+    response = post(client, '/gray', data, headers={'Accept': accept})
+    assert response.status_code == 406
+    assert not json.loads(response.data)['success']
+
+
+@pytest.mark.parametrize('accept', [None, '*/*', 'application/json', 'application/json, image/png;q=0.5'])
+def test_json_accept_returns_json(client, accept):
+    response = post(client, '/gray', headers={'Accept': accept} if accept else {})
+    assert response.status_code == 200
+    assert json.loads(response.data)['success']
+
+
+def test_multipart_accept_returns_multipart(client):
+    response = post(client, '/gray', headers={'Accept': 'multipart/mixed'})
+    assert response.status_code == 200
+    assert response.mimetype == 'multipart/mixed'
+
+
+@pytest.mark.parametrize('path, data', [
+    ('/rotation', {'angle': 'nan'}),
+    ('/rotation', {'angle': 'inf'}),
+    ('/rotation/naive', {'angle': '-inf'}),
+    ('/thresh/mean', {'sweep': '[[11, Infinity]]', 'value': 255}),
+    ('/thresh/gauss', {'sweep': '[[11, NaN]]', 'value': 255}),
+    ('/thresh/mean', {'blocksize': 11, 'c': 'inf', 'value': 255}),
+    ('/frontal', {'min_neighbours': 3, 'scale': 'inf'}),
+    ('/frontal', {'min_neighbours': 3, 'scale': 'nan'}),
+    ('/sobel', {'dx': 0, 'dy': 0, 'ksize': 3, 'delta': 0}),
+])
+def test_invalid_parameters_are_rejected(client, path, data):
+    response = post(client, path, data, headers={'Accept': 'image/png'})
+    assert response.status_code == 400
+    assert not json.loads(response.data)['success']
+
+
+def test_json_extra_is_json(client):
+    data = {'d': 31, 'sigma': 40, 'engine': 'guided'}
+    single = json.loads(post(client, '/bilateral', data).data)
+    assert single['extra'] == {'engine': 'guided'}
+    response = post(client, '/bilateral', data, headers={'Accept': 'image/jpeg'})
+    assert json.loads(response.headers['X-Extra']) == single['extra']
+
+
+def test_method_page_steps_odd_params_from_odd_minimum(client):
+    median = client.get('/median').data.decode()
+    assert re.search(r'id="ksize"[^>]*min="1"[^>]*step="2"', median)
+    canny = client.get('/canny').data.decode()
+    blur = re.search(r'id="blur"[^>]*>', canny).group(0)
+    assert 'step=' not in blur
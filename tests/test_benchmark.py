@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK = os.path.join(ROOT, 'benchmarks', 'benchmark.py')
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# cheap cases of the committed quick baseline
+METHODS = '^(to_grayscale|global_threshold|rotate)$'
+
+
+def run_benchmark(baseline, *args):
+    return subprocess.run([sys.executable, BENCHMARK, '--quick', '--methods', METHODS, '--baseline', baseline] + list(args),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=ROOT)
+
+
+def test_quick_run_matches_committed_baseline(tmp_path):
+    # baseline comes from another machine, so only gross regressions would be real
+    output = str(tmp_path / 'report.json')
+    process = run_benchmark(BASELINE, '--tolerance', '10', '--output', output)
+    assert process.returncode == 0, process.stderr
+    assert 'No regressions' in process.stderr
+    with open(output) as f:
+        assert {result['method'] for result in json.load(f)['results']} == {'to_grayscale', 'global_threshold', 'rotate'}
+
+
+def test_regression_fails(tmp_path):
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    for result in baseline['results']:
+        result['p50_ms'] /= 1000
+    path = str(tmp_path / 'baseline.json')
+    with open(path, 'w') as f:
+        json.dump(baseline, f)
+    process = run_benchmark(path, '--min-delta-ms', '0', '--output', str(tmp_path / 'report.json'))
+    assert process.returncode == 1
+    assert 'REGRESSIONS' in process.stderr
+
+
+def test_baseline_without_matching_cases_fails(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    with open(path, 'w') as f:
+        json.dump({'meta': {}, 'results': []}, f)
+    process = run_benchmark(path, '--output', str(tmp_path / 'report.json'))
+    assert process.returncode == 1
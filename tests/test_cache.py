@@ -0,0 +1,38 @@
+import os
+import time
+import cache
+
+
+def result(size):
+    return b'x' * size, 'image/png', None, None
+
+
+def stored(store, key):
+    return os.path.exists(store._disk_path(key))
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    store = cache.ResultCache(0, str(tmp_path), 3500)
+    for index, key in enumerate(('a' * 64, 'b' * 64, 'c' * 64)):
+        store.get_or_compute(key, lambda: result(1000))
+        # files are written in the same second, make the order of their modification times explicit
+        past = time.time() - 100 + index
+        os.utime(store._disk_path(key), (past, past))
+    # disk hit makes the oldest entry the most recently used one
+    assert store.get_or_compute('a' * 64, lambda: result(1)) == (b'x' * 1000, 'image/png', None, None)
+    store.get_or_compute('d' * 64, lambda: result(1000))
+    assert stored(store, 'a' * 64)
+    assert not stored(store, 'b' * 64)
+    assert stored(store, 'd' * 64)
+
+
+def test_disk_store_is_scanned_only_when_budget_is_exceeded(tmp_path, monkeypatch):
+    store = cache.ResultCache(0, str(tmp_path), 100000)
+    scans = []
+    scan = store._disk_scan_and_evict
+    monkeypatch.setattr(store, '_disk_scan_and_evict', lambda: (scans.append(1), scan()))
+    for index in range(20):
+        store.get_or_compute('%064x' % index, lambda: result(1000))
+    # the first put counts existing files
+    assert len(scans) == 1
+    assert 20000 <= store.stats()['disk_bytes'] <= 100000
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import imageprocessor as improc
+
+
+def colour_image():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    image[:240, :320] = (40, 120, 200)
+    return image
+
+
+@pytest.mark.parametrize('d', [21, 31, 101])
+def test_guided_filter_filters_every_channel(d):
+    image = colour_image()
+    result = improc.guided_filter(image, d // 2, 40)
+    for channel in range(3):
+        reference = improc.guided_filter(np.ascontiguousarray(image[:, :, channel]), d // 2, 40)
+        np.testing.assert_array_equal(result[:, :, channel], reference)
+    # flat patch (away from its border) keeps its colour
+    assert (result[:40, :40] == (40, 120, 200)).all()
+
+
+def test_bilateral_filter_guided_engine_keeps_flat_colour():
+    image = np.full((64, 64, 3), (40, 120, 200), dtype=np.uint8)
+    result, error, extra = improc.ImageProcessor().bilateral_filter(image, 31, 40)
+    assert error is None
+    assert extra == {'engine': 'guided'}
+    assert (result == (40, 120, 200)).all()
+
+
+@pytest.mark.parametrize('method, angle, corner', [
+    ('rotate', 90, (0, -1)),
+    ('rotate', 45, (0, None)),
+    ('naive_rotate', 90, (-1, 0)),
+])
+def test_rotation_direction(method, angle, corner):
+    # marked top left corner goes to top right when turned clockwise, to bottom left when turned counterclockwise
+    image = np.zeros((64, 64), dtype=np.uint8)
+    image[:8, :8] = 255
+    result, error = getattr(improc.ImageProcessor(), method)(image, angle)
+    assert error is None
+    ys, xs = np.nonzero(result)
+    row, column = corner
+    if row is not None:
+        assert abs(ys.mean() - (row % result.shape[0])) < 8
+    if column is not None:
+        assert abs(xs.mean() - (column % result.shape[1])) < 8
@@ -0,0 +1,43 @@
+import threading
+import jobs
+
+
+def managers(directory, count = 2):
+    # managers sharing a directory behave like jobs of gunicorn workers
+    return [jobs.JobManager(1, 4, 60, str(directory)) for _ in range(count)]
+
+
+def test_job_is_polled_through_another_worker(tmp_path):
+    first, second = managers(tmp_path)
+    release = threading.Event()
+    job, error = first.submit(lambda: (release.wait(5), 'result')[1])
+    assert error is None
+    assert second.get(job.id).state in (jobs.JOB_PENDING, jobs.JOB_RUNNING)
+    release.set()
+    polled = second.get(job.id, wait=5)
+    assert polled.state == jobs.JOB_DONE
+    assert polled.result == 'result'
+
+
+def test_job_is_cancelled_through_another_worker(tmp_path):
+    first, second = managers(tmp_path)
+    release = threading.Event()
+    started = []
+    blocker, _ = first.submit(lambda: release.wait(5))
+    job, _ = first.submit(lambda: started.append(True))
+    assert second.cancel(job.id)
+    assert second.get(job.id).state == jobs.JOB_CANCELLED
+    assert first.get(job.id).state == jobs.JOB_CANCELLED
+    release.set()
+    first.get(blocker.id, wait=5)
+    first.executor.shutdown(wait=True)
+    assert not started
+    assert not second.cancel(job.id)
+
+
+def test_unknown_jobs_are_not_found(tmp_path):
+    manager, = managers(tmp_path, 1)
+    assert manager.get('0' * 32) is None
+    assert manager.get('../' + '0' * 29) is None
+    assert not manager.cancel('0' * 32)
+    assert jobs.JobManager(1, 4, 60).get('0' * 32) is None
@@ -0,0 +1,65 @@
+import io
+import struct
+import zlib
+import numpy as np
+import pytest
+from cv2 import cv2
+import app as service
+import decoding
+import limits
+
+
+def png_header(width, height):
+    # PNG without pixel data, its header declares the size
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + chunk(b'IEND', b'')
+
+
+def chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def png(h = 32, w = 48):
+    return cv2.imencode('.png', np.zeros((h, w, 3), dtype=np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def client():
+    service.app.config['TESTING'] = True
+    with service.app.test_client() as client:
+        yield client
+
+
+@pytest.mark.parametrize('width, height', [(20000, 10500), (20000, 20000), (40000, 40000)])
+def test_headers_of_decompression_bombs_are_read(width, height):
+    assert decoding.read_header(png_header(width, height)) == ((width, height), 'PNG')
+    error, too_large = decoding.check_pixels(png_header(width, height), limits.MAX_PIXELS)
+    assert error and too_large
+
+
+def test_unreadable_header_is_rejected_when_limited():
+    assert decoding.check_pixels(b'not an image', 1000) == ("Image could not be decoded", False)
+    assert decoding.check_pixels(b'not an image', 0) == (None, False)
+    assert decoding.check_pixels(png(), 1000) == ('Image has 48 x 32 pixels, at most 1000 pixels are allowed', True)
+    assert decoding.check_pixels(png(), 10000) == (None, False)
+
+
+def test_oversized_image_is_rejected_with_413(client):
+    response = client.post('/gray', data={'image': (io.BytesIO(png_header(20000, 10500)), 'bomb.png')}, content_type='multipart/form-data')
+    assert response.status_code == 413
+
+
+def test_oversized_image_of_batch_is_reported_per_image(client):
+    images = [(io.BytesIO(png()), 'a.png'), (io.BytesIO(png_header(20000, 10500)), 'bomb.png'), (io.BytesIO(png()), 'b.png')]
+    response = client.post('/batch', data={'images': images, 'steps': '[{"method": "gray"}]'}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False, True]
+    assert 'pixels' in results[1]['err']
+
+
+def test_oversized_image_of_face_batch_is_reported_per_image(client):
+    images = [(io.BytesIO(png_header(20000, 10500)), 'bomb.png'), (io.BytesIO(png()), 'a.png')]
+    response = client.post('/frontal/batch', data={'images': images, 'min_neighbours': 3, 'scale': 1.2}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [False, True]
@@ -0,0 +1,20 @@
+import pipeline
+
+
+def test_face_size_limits_are_scaled_proportionally():
+    params = [5, 1.2, 120, 400, 1024, 'frontal']
+    assert pipeline.scale_params('haar_frontal_face_detection', params, 0.25) == [5, 1.2, 30, 100, 1024, 'frontal']
+    assert pipeline.scale_params('detect_frontal_faces', params, 0.25) == [5, 1.2, 30, 100, 1024, 'frontal']
+
+
+def test_disabled_face_size_limits_stay_disabled():
+    assert pipeline.scale_params('detect_frontal_faces', [5, 1.2, 0, 0], 0.1) == [5, 1.2, 0, 0]
+    assert pipeline.scale_params('detect_frontal_faces', [5, 1.2, 3, 0], 0.1) == [5, 1.2, 1, 0]
+
+
+def test_kernel_sizes_stay_odd_and_in_range():
+    assert pipeline.scale_params('gaussian_blur', [29, 17, True], 0.5) == [15, 9, True]
+    assert pipeline.scale_params('mean_threshold', [11, 2.0, 255], 0.1) == [3, 2.0, 255]
+    assert pipeline.scale_params('bilateral_filter', [9, 75.0, 'auto'], 0.5) == [4, 75.0, 'auto']
+    assert pipeline.scale_params('canny_sweep', [[[50, 150]], 0, True, False], 0.5) == [[[50, 150]], 0, True, False]
+    assert pipeline.scale_params('mean_threshold_sweep', [[[29, 2.0], [51, 5.0]], 255, False], 0.5) == [[[15, 2.0], [25, 5.0]], 255, False]
@@ -0,0 +1,30 @@
+import os
+import numpy as np
+import pytest
+from cv2 import cv2
+import imageprocessor as improc
+import processes
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(processes, 'PROCESS_WORKERS', 1)
+    monkeypatch.setattr(processes, 'executor', None)
+    yield
+    if processes.executor is not None:
+        processes.executor.shutdown()
+
+
+def test_pool_processes_use_configured_opencv_threads(pool, monkeypatch):
+    # differs from the default of spawned processes (number of cores) on any machine
+    threads = (os.cpu_count() or 1) + 1
+    monkeypatch.setattr(processes, 'PROCESS_OPENCV_THREADS', threads)
+    assert processes.get_executor().submit(cv2.getNumThreads).result() == threads
+
+
+def test_call_matches_thread_result(pool):
+    image = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    method = improc.ImageProcessor().median_blur
+    result, error, _ = processes.call(method, image, [5])
+    assert error is None
+    np.testing.assert_array_equal(result, method(image, 5)[0])
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import imageprocessor as improc
+import tiling
+
+# parameters of every tiled method, biggest supported neighbourhoods included
+TILED_PARAMS = {
+    'median_blur': [[3], [5], [31]],
+    'average_blur': [[3, 3], [15, 31]],
+    'gaussian_blur': [[5, 5], [31, 15], [31, 31, True]],
+    'bilateral_filter': [[9, 50, 'auto'], [15, 75, 'bilateral'], [41, 75, 'bilateral']],
+    'mean_threshold': [[11, 2, 255], [51, -3, 200]],
+    'gaussian_threshold': [[11, 2, 255], [51, 5, 255]],
+    'sobel': [[1, 0, 1, 0], [1, 1, 3, 0], [0, 1, 31, 10]],
+    'laplacian': [[1, 0], [7, 20]],
+    'gradient': [[3], [31]],
+}
+
+
+def test_every_tiled_method_is_tested():
+    assert set(TILED_PARAMS) == set(tiling.TILED_METHODS)
+
+
+def image(channels):
+    rng = np.random.default_rng(1)
+    noise = rng.integers(0, 256, (203, 301, channels), dtype=np.uint8)
+    shapes = np.zeros_like(noise)
+    shapes[40:160, 60:240] = 200
+    shapes[90:110] = 90
+    result = (noise // 4 + shapes * 3 // 4).astype(np.uint8)
+    return result[:, :, 0] if channels == 1 else result
+
+
+@pytest.mark.parametrize('method_name, params', [(name, params) for name, cases in TILED_PARAMS.items() for params in cases])
+def test_tiled_result_is_the_same_as_untiled(method_name, params):
+    method = getattr(improc.ImageProcessor(), method_name)
+    gray = method_name in ('mean_threshold', 'gaussian_threshold')
+    source = image(1 if gray else 3)
+    expected = method(source, *params)
+    assert expected[1] is None
+    halo, _ = tiling.TILED_METHODS[method_name]
+    tiled = tiling.run_tiled(source, lambda tile: method(tile, *params), halo(*params), tile_size=64)
+    assert tiled[1] is None
+    np.testing.assert_array_equal(tiled[0], expected[0])
+
+
+@pytest.mark.parametrize('method_name, params', [
+    ('bilateral_filter', [31, 50, 'auto']),
+    ('bilateral_filter', [9, 50, 'guided']),
+    ('gradient', [5, 1]),
+    ('canny_edge_detection', [50, 150]),
+])
+def test_methods_depending_on_whole_image_are_not_tiled(monkeypatch, method_name, params):
+    monkeypatch.setattr(tiling, 'TILE_MIN_PIXELS', 1)
+    monkeypatch.setattr(tiling, 'run_tiled', None)
+    method = getattr(improc.ImageProcessor(), method_name)
+    source = image(3)
+    np.testing.assert_array_equal(tiling.call(method, source, params)[0], method(source, *params)[0])
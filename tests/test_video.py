@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import tempfile
+import numpy as np
+import pytest
+from cv2 import cv2
+import admission
+import app as service
+import video
+
+
+@pytest.fixture
+def client():
+    # not used as context manager, which would keep the last request (and its uploads) open
+    service.app.config['TESTING'] = True
+    return service.app.test_client()
+
+
+@pytest.fixture
+def tempdir(tmp_path, monkeypatch):
+    # temporary files of the service are created here, so leaks can be seen
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'spool'))
+    os.mkdir(tempfile.tempdir)
+    return tempfile.tempdir
+
+
+def avi(tmp_path, frames = 12, h = 240, w = 320):
+    # noise does not compress, so the upload is bigger than app.UPLOAD_SPOOL_BYTES
+    path = str(tmp_path / 'input.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (w, h))
+    rng = np.random.default_rng(0)
+    for _ in range(frames):
+        writer.write(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+    writer.release()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def post_video(client, data, output):
+    form = {'steps': json.dumps([{'method': 'gray'}]), 'output': output, 'video': (io.BytesIO(data), 'input.avi')}
+    return client.post('/video', data=form, content_type='multipart/form-data')
+
+
+def test_write_video_removes_file_when_processing_raises(tempdir):
+    def results():
+        yield np.zeros((16, 16, 3), dtype=np.uint8), None, None
+        raise RuntimeError('processing failed')
+
+    with pytest.raises(RuntimeError):
+        video.write_video(results(), 25)
+    assert os.listdir(tempdir) == []
+
+
+def test_write_video_removes_file_without_frames(tempdir):
+    assert video.write_video(iter([]), 25) == (None, "Video does not contain any frames")
+    assert os.listdir(tempdir) == []
+
+
+def test_upload_path_reuses_named_file(tmp_path):
+    with tempfile.NamedTemporaryFile('wb+', dir=str(tmp_path)) as f:
+        assert video.upload_path(f) == (f.name, False)
+    path, copied = video.upload_path(io.BytesIO(b'data'))
+    assert copied
+    video.remove_file(path)
+
+
+@pytest.mark.parametrize('output', ['avi', 'mjpeg'])
+def test_video_leaves_no_temporary_files(client, tmp_path, tempdir, output):
+    data = avi(tmp_path)
+    assert len(data) > service.UPLOAD_SPOOL_BYTES
+    response = post_video(client, data, output)
+    assert response.status_code == 200
+    assert response.data
+    response.close()
+    assert os.listdir(tempdir) == []
+
+
+def test_rejected_video_leaves_no_temporary_files(client, tmp_path, tempdir, monkeypatch):
+    controller = admission.AdmissionController(100, 0, 100, 0)
+    controller.acquire(100)
+    monkeypatch.setattr(admission, 'admission_controller', controller)
+    response = post_video(client, avi(tmp_path), 'avi')
+    assert response.status_code == 429
+    assert os.listdir(tempdir) == []